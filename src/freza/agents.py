@@ -3,19 +3,33 @@
 from __future__ import annotations
 
 import json
-import re
+import os
+import string
 import time
+from collections.abc import Callable, Iterable
+from pathlib import Path
 from typing import Any
 
+from freza import jsonio
 from freza.config import Config, MEMORY_TEMPLATE
+from freza.memory import _flock
 
-_NAME_RE = re.compile(r"^[a-zA-Z0-9][a-zA-Z0-9_-]*$")
+# Equivalent to ^[a-zA-Z0-9][a-zA-Z0-9_-]*$, checked with C-level str ops.
+_NAME_FIRST_CHARS = frozenset(string.ascii_letters + string.digits)
+_NAME_STRIP_ALLOWED = str.maketrans("", "", string.ascii_letters + string.digits + "_-")
 DEFAULT_AGENT_NAME = "default"
 DEFAULT_AGENT_DESCRIPTION = "Default general-purpose agent"
+META_FORMAT_VERSION = 1
+# How long a previously parsed agent.json may be served after reads start failing.
+CONFIG_STALE_TTL = 60.0
 
 
 def is_valid_agent_name(name: str) -> bool:
-    return isinstance(name, str) and bool(_NAME_RE.fullmatch(name))
+    return (
+        isinstance(name, str)
+        and name[:1] in _NAME_FIRST_CHARS
+        and not name.translate(_NAME_STRIP_ALLOWED)
+    )
 
 
 def validate_agent_name(name: str) -> str:
@@ -27,40 +41,164 @@ def validate_agent_name(name: str) -> str:
     return name
 
 
+def _write_if_missing(path: Path, content: Callable[[], str]) -> bool:
+    """Create *path* unless it already exists (single open, no stat).
+
+    *content* is only called once the exclusive create has succeeded, so
+    the common already-present path does no string work at all.
+    """
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+    except FileExistsError:
+        return False
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(content())
+    return True
+
+
+def _seed_memory_file(path: Path, agent_name: str, description: str) -> bool:
+    """Write the initial memory.md unless one exists."""
+    desc_line = f"\n{description}" if description else ""
+    return _write_if_missing(
+        path,
+        lambda: MEMORY_TEMPLATE.format(agent_name=agent_name, description_line=desc_line),
+    )
+
+
 class AgentManager:
     def __init__(self, config: Config):
         self.config = config
+        self._meta_path = str(config.agents_meta)
+        self._tmp_path = str(config.agents_meta.with_suffix(".tmp"))
+        # (mtime_ns, size, inode) of the metadata file, or None while it does
+        # not exist -> parsed list + name index + whether the parse was complete
+        self._cache: tuple[
+            tuple[int, int, int] | None, list[dict[str, Any]], dict[str, dict[str, Any]], bool
+        ] | None = None
+        # agent name -> ((mtime_ns, size), parsed_at, agent.json contents)
+        self._config_cache: dict[str, tuple[tuple[int, int], float, dict[str, Any]]] = {}
 
-    def _read(self) -> list[dict[str, Any]]:
-        if not self.config.agents_meta.exists():
-            return []
+    def _stat_key(self) -> tuple[int, int, int] | None:
         try:
-            return json.loads(self.config.agents_meta.read_text())
-        except (json.JSONDecodeError, OSError):
-            return []
+            st = os.stat(self._meta_path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def _parse_file(self) -> tuple[list[dict[str, Any]], bool]:
+        """Read agent records from disk; return (records, complete).
+
+        Layout is a header line (``{"v": 1, "n": ..., "updated_at": ...}``)
+        followed by one JSON record per line. Files still holding the legacy
+        single JSON array are parsed whole. ``complete`` is False when the
+        version is unknown, a line is corrupt or fewer than ``n`` records are
+        present; the records read up to that point are still returned.
+        """
+        data: list[dict[str, Any]] = []
+        try:
+            with open(self._meta_path, "rb") as f:
+                first = f.readline()
+                if not first.strip():
+                    return data, not f.read().strip()
+                if first.lstrip().startswith(b"["):
+                    legacy = jsonio.loads(first + f.read())
+                    return legacy, True
+                header = jsonio.loads(first)
+                if not isinstance(header, dict) or header.get("v") != META_FORMAT_VERSION:
+                    return data, False
+                for line in f:
+                    if line.strip():
+                        rec = jsonio.loads(line)
+                        if not isinstance(rec, dict):
+                            return data, False
+                        data.append(rec)
+        except FileNotFoundError:
+            return data, True
+        except (jsonio.JSONDecodeError, OSError):
+            return data, False
+        return data, header.get("n", len(data)) == len(data)
+
+    def _load(
+        self, for_update: bool = False
+    ) -> tuple[list[dict[str, Any]], dict[str, dict[str, Any]]]:
+        """Return (records, name -> record) from the cache or disk.
+
+        With *for_update* the caller is about to ``_write`` the records back,
+        so a partial parse raises instead of silently dropping the agents
+        that could not be read.
+        """
+        key = self._stat_key()
+        cache = self._cache
+        if cache is None or cache[0] != key:
+            data, complete = self._parse_file() if key is not None else ([], True)
+            index = {rec["name"]: rec for rec in data if "name" in rec}
+            cache = self._cache = (key, data, index, complete)
+        if for_update and not cache[3]:
+            raise RuntimeError(
+                f"{self._meta_path} could not be read completely; "
+                f"refusing to rewrite it and lose agents. Fix or remove the file."
+            )
+        return cache[1], cache[2]
+
+    def _read(self) -> list[dict[str, Any]]:
+        return self._load()[0]
+
+    def _index(self) -> dict[str, dict[str, Any]]:
+        return self._load()[1]
 
     def _write(self, data: list[dict[str, Any]]):
-        tmp = self.config.agents_meta.with_suffix(".tmp")
-        tmp.write_text(json.dumps(data, indent=2))
-        tmp.rename(self.config.agents_meta)
+        self._cache = None
+        header = {"v": META_FORMAT_VERSION, "n": len(data), "updated_at": time.time()}
+        with os.fdopen(
+            os.open(self._tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644),
+            "wb",
+            buffering=1 << 16,
+        ) as f:
+            f.write(jsonio.dumps(header))
+            for rec in data:
+                f.write(b"\n")
+                f.write(jsonio.dumps(rec))
+            f.write(b"\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(self._tmp_path, self._meta_path)
 
     def list_agents(self) -> list[dict[str, Any]]:
         return self._read()
 
     def get_agent(self, name: str) -> dict[str, Any] | None:
-        for agent in self._read():
-            if agent.get("name") == name:
-                return agent
-        return None
+        # The first lookup parses the file once; later ones are a stat and a
+        # dict hit until the file changes.
+        return self._index().get(name)
+
+    def has_agent(self, name: str) -> bool:
+        return self.get_agent(name) is not None
 
     def get_agent_config(self, name: str) -> dict[str, Any] | None:
+        # agent.json stays authoritative since agents may hand-edit it; agents
+        # registered without one resolve from the (cached) metadata record.
         config_file = self.config.agent_config_file(name)
-        if not config_file.exists():
-            return None
+        cached = self._config_cache.get(name)
         try:
-            return json.loads(config_file.read_text())
-        except (json.JSONDecodeError, OSError):
+            st = os.stat(config_file)
+            key = (st.st_mtime_ns, st.st_size)
+            if cached is not None and cached[0] == key:
+                return cached[2]
+            data = jsonio.loads(config_file.read_bytes())
+        except FileNotFoundError:
+            self._config_cache.pop(name, None)
+        except (jsonio.JSONDecodeError, OSError):
+            # Mid-edit or transient failure: serve the last good parse for a while.
+            if cached is not None and time.monotonic() - cached[1] < CONFIG_STALE_TTL:
+                return cached[2]
+        else:
+            self._config_cache[name] = (key, time.monotonic(), data)
+            return data
+
+        agent = self.get_agent(name)
+        if agent is None:
             return None
+        return {k: v for k, v in agent.items() if k not in ("created_at", "updated_at")}
 
     def ensure_default_agent(self):
         default = self.get_agent(DEFAULT_AGENT_NAME)
@@ -68,65 +206,98 @@ class AgentManager:
             self.register(DEFAULT_AGENT_NAME, DEFAULT_AGENT_DESCRIPTION)
             return
 
+        cfg = self.config
         description = default.get("description", DEFAULT_AGENT_DESCRIPTION)
-        agent_dir = self.config.agent_dir(DEFAULT_AGENT_NAME)
-        agent_dir.mkdir(parents=True, exist_ok=True)
 
-        config_file = self.config.agent_config_file(DEFAULT_AGENT_NAME)
-        if not config_file.exists():
+        # One directory read tells us which seed files already exist.
+        agent_dir = cfg.agent_dir(DEFAULT_AGENT_NAME)
+        try:
+            with os.scandir(agent_dir) as it:
+                present = {e.name for e in it}
+        except FileNotFoundError:
+            agent_dir.mkdir(parents=True, exist_ok=True)
+            present = set()
+
+        config_file = cfg.agent_config_file(DEFAULT_AGENT_NAME)
+        if config_file.name not in present:
             config_data = {"name": DEFAULT_AGENT_NAME, "description": description}
-            config_file.write_text(json.dumps(config_data, indent=2))
-
-        memory_file = self.config.agent_memory_file(DEFAULT_AGENT_NAME)
-        if not memory_file.exists():
-            desc_line = f"\n{description}" if description else ""
-            memory_file.write_text(
-                MEMORY_TEMPLATE.format(
-                    agent_name=DEFAULT_AGENT_NAME,
-                    description_line=desc_line,
-                )
-            )
+            _write_if_missing(config_file, lambda: json.dumps(config_data, indent=2))
 
-    def register(self, name: str, description: str, **extra):
-        name = validate_agent_name(name)
-
-        agents = self._read()
-        found = False
-        for agent in agents:
-            if agent.get("name") == name:
-                agent["description"] = description
-                agent["updated_at"] = time.time()
-                agent.update(extra)
-                found = True
-                break
-        if not found:
-            agents.append({
-                "name": name,
-                "description": description,
-                "created_at": time.time(),
-                "updated_at": time.time(),
-                **extra,
-            })
-        self._write(agents)
-
-        # Create agent directory and files
-        agent_dir = self.config.agent_dir(name)
-        agent_dir.mkdir(parents=True, exist_ok=True)
-
-        # Write agent.json config
-        config_file = self.config.agent_config_file(name)
-        config_data = {"name": name, "description": description, **extra}
-        config_file.write_text(json.dumps(config_data, indent=2))
-
-        # Seed memory if it doesn't exist
-        memory_file = self.config.agent_memory_file(name)
-        if not memory_file.exists():
-            desc_line = f"\n{description}" if description else ""
-            memory_file.write_text(
-                MEMORY_TEMPLATE.format(agent_name=name, description_line=desc_line)
-            )
+        memory_file = cfg.agent_memory_file(DEFAULT_AGENT_NAME)
+        if memory_file.name not in present:
+            _seed_memory_file(memory_file, DEFAULT_AGENT_NAME, description)
+
+    def register(
+        self,
+        name: str,
+        description: str,
+        *,
+        write_per_agent_config: bool = True,
+        **extra,
+    ):
+        self.register_many(
+            [(name, description, extra)],
+            write_per_agent_config=write_per_agent_config,
+        )
+
+    def register_many(
+        self,
+        entries: Iterable[tuple[str, str, dict[str, Any]]],
+        *,
+        write_per_agent_config: bool = True,
+    ):
+        """Register or update several agents with a single metadata rewrite.
+
+        *entries* are ``(name, description, extra)`` tuples; ``extra`` holds
+        the same keyword fields :meth:`register` accepts.
+        """
+        entries = [
+            (validate_agent_name(name), description, dict(extra or {}))
+            for name, description, extra in entries
+        ]
+        if not entries:
+            return
+        cfg = self.config
+
+        with _flock(cfg.agents_meta):
+            agents, index = self._load(for_update=True)
+            now = time.time()
+            for name, description, extra in entries:
+                agent = index.get(name)
+                if agent is not None:
+                    agent["description"] = description
+                    agent["updated_at"] = now
+                    agent.update(extra)
+                else:
+                    agent = {
+                        "name": name,
+                        "description": description,
+                        "created_at": now,
+                        "updated_at": now,
+                        **extra,
+                    }
+                    agents.append(agent)
+                    index[name] = agent
+            self._write(agents)
+
+        for name, description, extra in entries:
+            # Create agent directory and files
+            cfg.agent_dir(name).mkdir(parents=True, exist_ok=True)
+
+            # agent.json duplicates the metadata record; callers that don't
+            # need the hand-editable copy can skip the extra write.
+            if write_per_agent_config:
+                config_data = {"name": name, "description": description, **extra}
+                cfg.agent_config_file(name).write_text(json.dumps(config_data, indent=2))
+
+            # Seed memory if it doesn't exist
+            _seed_memory_file(cfg.agent_memory_file(name), name, description)
 
     def unregister(self, name: str):
-        agents = self._read()
-        agents = [a for a in agents if a.get("name") != name]
-        self._write(agents)
+        with _flock(self.config.agents_meta):
+            agents, index = self._load(for_update=True)
+            agent = index.pop(name, None)
+            if agent is None:
+                return
+            agents.remove(agent)
+            self._write(agents)
@@ -2,61 +2,92 @@
 
 from __future__ import annotations
 
-import json
+import os
 import time
 from typing import Any
 
+from freza import jsonio
 from freza.config import Config
+from freza.memory import _flock
 
 
 class ChannelManager:
     def __init__(self, config: Config):
         self.config = config
+        self._meta_path = str(config.channels_meta)
+        self._tmp_path = str(config.channels_meta.with_suffix(".tmp"))
+        # (mtime_ns, size, inode) of the metadata file -> parsed list + name index
+        self._cache: tuple[
+            tuple[int, int, int], list[dict[str, Any]], dict[str, dict[str, Any]]
+        ] | None = None
 
-    def _read(self) -> list[dict[str, Any]]:
-        if not self.config.channels_meta.exists():
-            return []
+    def _load(self) -> tuple[list[dict[str, Any]], dict[str, dict[str, Any]]]:
+        try:
+            st = os.stat(self._meta_path)
+        except OSError:
+            return [], {}
+        key = (st.st_mtime_ns, st.st_size, st.st_ino)
+        cache = self._cache
+        if cache is not None and cache[0] == key:
+            return cache[1], cache[2]
         try:
-            return json.loads(self.config.channels_meta.read_text())
-        except (json.JSONDecodeError, OSError):
-            return []
+            with open(self._meta_path, "rb") as f:
+                data = jsonio.loads(f.read())
+        except (jsonio.JSONDecodeError, OSError):
+            return [], {}
+        index = {rec["name"]: rec for rec in data if "name" in rec}
+        self._cache = (key, data, index)
+        return data, index
+
+    def _read(self) -> list[dict[str, Any]]:
+        return self._load()[0]
+
+    def _index(self) -> dict[str, dict[str, Any]]:
+        return self._load()[1]
 
     def _write(self, data: list[dict[str, Any]]):
-        tmp = self.config.channels_meta.with_suffix(".tmp")
-        tmp.write_text(json.dumps(data, indent=2))
-        tmp.rename(self.config.channels_meta)
+        self._cache = None
+        with os.fdopen(
+            os.open(self._tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644),
+            "wb",
+            buffering=1 << 16,
+        ) as f:
+            jsonio.dump(data, f, indent=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(self._tmp_path, self._meta_path)
 
     def list_channels(self) -> list[dict[str, Any]]:
         return self._read()
 
     def get_channel(self, name: str) -> dict[str, Any] | None:
-        for ch in self._read():
-            if ch.get("name") == name:
-                return ch
-        return None
+        return self._index().get(name)
 
     def register(self, name: str, description: str, **extra):
-        channels = self._read()
-        found = False
-        for ch in channels:
-            if ch.get("name") == name:
+        with _flock(self.config.channels_meta):
+            channels, index = self._load()
+            now = time.time()
+            ch = index.get(name)
+            if ch is not None:
                 ch["description"] = description
-                ch["updated_at"] = time.time()
+                ch["updated_at"] = now
                 ch.update(extra)
-                found = True
-                break
-        if not found:
-            channels.append({
-                "name": name,
-                "description": description,
-                "created_at": time.time(),
-                "updated_at": time.time(),
-                **extra,
-            })
-        self._write(channels)
+            else:
+                channels.append({
+                    "name": name,
+                    "description": description,
+                    "created_at": now,
+                    "updated_at": now,
+                    **extra,
+                })
+            self._write(channels)
         (self.config.channels_dir / name).mkdir(parents=True, exist_ok=True)
 
     def unregister(self, name: str):
-        channels = self._read()
-        channels = [ch for ch in channels if ch.get("name") != name]
-        self._write(channels)
+        with _flock(self.config.channels_meta):
+            channels, index = self._load()
+            ch = index.pop(name, None)
+            if ch is None:
+                return
+            channels.remove(ch)
+            self._write(channels)
@@ -4,41 +4,83 @@ from __future__ import annotations
 
 import argparse
 import asyncio
+import concurrent.futures
+import functools
 import importlib.util
-import json
+import io
 import os
-import platform
 import shutil
 import subprocess
 import sys
 import tempfile
 import time
 import traceback
-from datetime import datetime, timezone
+import weakref
+from collections import Counter
 from pathlib import Path
+from types import ModuleType
+from typing import TYPE_CHECKING
 
 # Prevent "nested Claude Code session" detection when spawned
 # from within a Claude Code context (e.g. WebUI channel).
 os.environ.pop("CLAUDECODE", None)
 
+from freza import jsonio
 from freza.config import Config
-from freza.memory import MemoryManager
+from freza.logs import LOG_BODY_FIELDS, logs_newest_first
+from freza.memory import MemoryManager, _flock
 from freza.registry import InstanceRegistry, InstanceInfo
 from freza.channels import ChannelManager
 from freza.agents import AgentManager, validate_agent_name
-from freza.llm import invoke_claude, LLMError, InvocationResult
 
+if TYPE_CHECKING:
+    # freza.llm pulls in the Claude Agent SDK; only the invoke paths import it.
+    from freza.llm import InvocationResult
 
-def _system_prompt(
-    config: Config,
-    instance: InstanceInfo,
+
+# Managers keep parsed-file caches, so share one of each per Config for the
+# life of the process instead of re-reading state in every command helper.
+_managers: weakref.WeakKeyDictionary[Config, dict[type, object]] = weakref.WeakKeyDictionary()
+
+
+def _shared(cls, config: Config):
+    per_config = _managers.setdefault(config, {})
+    manager = per_config.get(cls)
+    if manager is None:
+        manager = per_config[cls] = cls(config)
+    return manager
+
+
+def _agents(config: Config) -> AgentManager:
+    return _shared(AgentManager, config)
+
+
+def _channels(config: Config) -> ChannelManager:
+    return _shared(ChannelManager, config)
+
+
+def _registry(config: Config) -> InstanceRegistry:
+    return _shared(InstanceRegistry, config)
+
+
+@functools.lru_cache(maxsize=64)
+def _system_prompt_static(
     agent_name: str,
-    agent_config: dict | None = None,
-    channel_prompt: str | None = None,
+    agent_dir: Path,
+    memory_file: Path,
+    short_term_dir: Path,
+    channels_dir: Path,
+    tools_dir: Path,
+    agents_dir: Path,
+    agent_cmd: str,
+    agent_prompt: str | None,
+    channel_prompt: str | None,
 ) -> str:
-    agent_dir = config.agent_dir(agent_name)
-    memory_file = config.agent_memory_file(agent_name)
+    """Everything in the system prompt that does not depend on the instance.
 
+    It is identical across invocations of the same agent/channel pairing,
+    so the API's prompt cache can reuse it as a prefix.
+    """
     base = f"""\
 You are "{agent_name}", an autonomous agent running in a persistent environment.
 You may be one of several simultaneous instances of yourself.
@@ -47,15 +89,14 @@ Each agent has its own memory file and working directory.
 ## Environment
 - Your agent directory: {agent_dir}
 - Long-term memory:     {memory_file}
-- Short-term state:     {config.short_term_dir}/{instance.instance_id}.json
-- Channels dir:         {config.channels_dir}/
-- Your instance ID:     {instance.instance_id}
+- Short-term state:     {short_term_dir}/<instance ID>.json
+- Channels dir:         {channels_dir}/
 - Your agent name:      {agent_name}
 
 ## Memory Rules
 - Edit {memory_file} directly for persistent knowledge.
   Prefer the locked helper for appends:
-    {config.tools_dir}/update_memory.sh "text to append"
+    {tools_dir}/update_memory.sh "text to append"
 - Keep memory concise: identity, core knowledge, active projects, channels.
 - Update your short-term state file's "current_task" field so other
   instances know what you are doing.
@@ -65,39 +106,39 @@ You are part of a multi-agent system. Each agent has its own directory,
 memory, and optional custom invocation logic.
 
 To create a new agent:
-  {config.agent_cmd} register-agent <name> "<description>" [--system-prompt "..."]
+  {agent_cmd} register-agent <name> "<description>" [--system-prompt "..."]
 
-Agent directories live at {config.agents_dir}/<name>/ and contain:
+Agent directories live at {agents_dir}/<name>/ and contain:
   - agent.json:  Agent configuration (name, description, system_prompt)
   - memory.md:   Agent-specific long-term memory
   - invoke.py:   Optional custom invocation script (Claude Agent SDK)
 
 To invoke another agent directly:
-  {config.agent_cmd} invoke <agent_name> "<message>" [--thread-id <id>]
+  {agent_cmd} invoke <agent_name> "<message>" [--thread-id <id>]
 
 Custom invoke.py convention:
   async def invoke(prompt, system_prompt, agent_dir, config_path) -> str
 
 ## Channel System
 Channels are external programs that route messages to specific agents.
-1. Create a program in {config.channels_dir}/<name>/
+1. Create a program in {channels_dir}/<name>/
 2. That program should call back:
-     {config.agent_cmd} channel <name> "<message>" [--agent <agent_name>]
+     {agent_cmd} channel <name> "<message>" [--agent <agent_name>]
 3. Register the channel:
-     {config.agent_cmd} register-channel <name> "<description>" [--default-agent <name>]
+     {agent_cmd} register-channel <name> "<description>" [--default-agent <name>]
 4. To start/manage it as a background service, use systemd, supervisord,
    screen, or any method you prefer.
 5. Document it in your long-term memory.
 
 ### Multi-turn threads
 Pass --thread-id <id> to continue a conversation across invocations:
-  {config.agent_cmd} channel <name> "<message>" --thread-id <id>
+  {agent_cmd} channel <name> "<message>" --thread-id <id>
 The same thread ID reuses the prior Claude session, preserving context.
 
 ### Custom system prompts
 Set a channel-specific system prompt at registration time:
-  {config.agent_cmd} register-channel <name> "<desc>" --system-prompt "instructions"
-  {config.agent_cmd} register-channel <name> "<desc>" --system-prompt @file.txt
+  {agent_cmd} register-channel <name> "<desc>" --system-prompt "instructions"
+  {agent_cmd} register-channel <name> "<desc>" --system-prompt @file.txt
 The custom prompt is appended to the default system prompt for every
 invocation on that channel.
 
@@ -106,10 +147,10 @@ invocation on that channel.
 - Do not duplicate work another instance is already handling.
 - You have full bash, file-editing, and network access.
 """
-    if agent_config and agent_config.get("system_prompt"):
+    if agent_prompt:
         base += f"""
 ## Agent-Specific Instructions
-{agent_config['system_prompt']}
+{agent_prompt}
 """
     if channel_prompt:
         base += f"""
@@ -119,6 +160,40 @@ invocation on that channel.
     return base
 
 
+def _system_prompt(
+    config: Config,
+    instance: InstanceInfo,
+    agent_name: str,
+    agent_config: dict | None = None,
+    channel_prompt: str | None = None,
+) -> str:
+    static = _system_prompt_static(
+        agent_name,
+        config.agent_dir(agent_name),
+        config.agent_memory_file(agent_name),
+        config.short_term_dir,
+        config.channels_dir,
+        config.tools_dir,
+        config.agents_dir,
+        config.agent_cmd,
+        agent_config.get("system_prompt") if agent_config else None,
+        channel_prompt,
+    )
+    # Per-instance details go last so the prefix above stays stable.
+    return static + f"""
+## This Instance
+- Your instance ID:     {instance.instance_id}
+- Short-term state:     {config.short_term_dir}/{instance.instance_id}.json
+"""
+
+
+def _channel_line(ch: dict) -> str:
+    return (
+        f"- **{ch['name']}**: {ch.get('description', '')} "
+        f"(default_agent={ch.get('default_agent', 'default')})\n"
+    )
+
+
 def _user_prompt(
     config: Config,
     memory: MemoryManager,
@@ -131,91 +206,105 @@ def _user_prompt(
     channel_name: str | None,
     trigger_message: str | None,
 ) -> str:
-    parts: list[str] = []
+    buf = io.StringIO()
+    w = buf.write
 
     mem_content = memory.read()
-    parts.append("## Your Long-Term Memory\n")
-    if mem_content.strip():
-        parts.append(mem_content)
+    w("## Your Long-Term Memory\n\n")
+    if mem_content and not mem_content.isspace():
+        w(mem_content)
+        w("\n")
     else:
-        parts.append(
+        w(
             "(Memory is empty -- this may be your first run. "
-            "Consider initialising it.)"
+            "Consider initialising it.)\n"
         )
-    parts.append("")
+    w("\n")
 
     # Registered agents
     agent_list = agents.list_agents()
-    parts.append("## Registered Agents\n")
+    w("## Registered Agents\n\n")
     if agent_list:
         for a in agent_list:
             marker = " (you)" if a["name"] == agent_name else ""
             invoke_exists = config.agent_invoke_file(a["name"]).exists()
             invoke_info = " [custom invoke.py]" if invoke_exists else ""
-            parts.append(
-                f"- **{a['name']}**: {a.get('description', '')}{marker}{invoke_info}"
+            w(
+                f"- **{a['name']}**: {a.get('description', '')}{marker}{invoke_info}\n"
             )
     else:
-        parts.append("(none)")
-    parts.append("")
+        w("(none)\n")
+    w("\n")
 
     instances = registry.get_active()
     others = [i for i in instances if i.instance_id != instance.instance_id]
 
-    parts.append("## Active Instances\n")
-    parts.append(f"**You**: `{instance.instance_id}` (mode={instance.mode}, "
-                 f"agent={agent_name}, pid={instance.pid})")
+    w("## Active Instances\n\n")
+    w(f"**You**: `{instance.instance_id}` (mode={instance.mode}, "
+      f"agent={agent_name}, pid={instance.pid})\n")
     if others:
-        parts.append(f"\n{len(others)} other instance(s):\n")
+        w(f"\n{len(others)} other instance(s):\n\n")
+        states = memory.get_all_short_term({o.instance_id for o in others})
+        now = time.time()
         for o in others:
-            st = memory.read_short_term(o.instance_id)
+            st = states.get(o.instance_id)
             task = st.get("current_task", "unknown") if st else "unknown"
-            age = time.time() - o.started_at
-            parts.append(
+            age = now - o.started_at
+            w(
                 f"- `{o.instance_id}` mode={o.mode} agent={o.agent_name} "
-                f"task=\"{task}\" uptime={age:.0f}s"
+                f"task=\"{task}\" uptime={age:.0f}s\n"
             )
     else:
-        parts.append("\nYou are the only running instance.")
-    parts.append("")
+        w("\nYou are the only running instance.\n")
+    w("\n")
 
     chans = channels.list_channels()
-    parts.append("## Registered Channels\n")
+    w("## Registered Channels\n\n")
     if chans:
-        for ch in chans:
-            default_agent = ch.get("default_agent", "default")
-            parts.append(
-                f"- **{ch['name']}**: {ch.get('description', '')} "
-                f"(default_agent={default_agent})"
-            )
+        w("".join(map(_channel_line, chans)))
     else:
-        parts.append("(none)")
-    parts.append("")
+        w("(none)\n")
+    w("\n")
 
-    parts.append("## Trigger\n")
+    w("## Trigger\n\n")
     if mode == "channel":
-        parts.append(f"**Incoming message** on channel `{channel_name}`:\n")
-        parts.append(f"```\n{trigger_message}\n```\n")
-        parts.append("Respond to this message and take any appropriate actions.")
+        w(f"**Incoming message** on channel `{channel_name}`:\n\n")
+        w(f"```\n{trigger_message}\n```\n\n")
+        w("Respond to this message and take any appropriate actions.\n")
     elif mode == "invoke":
-        parts.append(f"**Direct invocation** of agent `{agent_name}`:\n")
-        parts.append(f"```\n{trigger_message}\n```\n")
-        parts.append("Respond to this message and take any appropriate actions.")
-    parts.append("")
+        w(f"**Direct invocation** of agent `{agent_name}`:\n\n")
+        w(f"```\n{trigger_message}\n```\n\n")
+        w("Respond to this message and take any appropriate actions.\n")
+
+    return buf.getvalue()
+
+
+_IS_WINDOWS = os.name == "nt"
+_KNOWN_CLAUDE_PATHS = [Path.home() / ".local" / "bin" / "claude"]
+if not _IS_WINDOWS:
+    _KNOWN_CLAUDE_PATHS.append(Path("/usr/local/bin/claude"))
 
-    return "\n".join(parts)
+# Path of the claude binary once found; re-checked with a single stat so a
+# long-lived process notices if it is removed.
+_claude_bin: str | None = None
+
+
+def _prepend_to_path(known_paths: list[Path]) -> str | None:
+    found = [p for p in known_paths if p.exists()]
+    if not found:
+        return None
+    dirs = [str(p.parent) for p in found]
+    os.environ["PATH"] = os.pathsep.join([*dirs, os.environ.get("PATH", "")])
+    return str(found[0])
 
 
 def _ensure_claude_cli():
-    if shutil.which("claude"):
+    global _claude_bin
+    if _claude_bin and os.path.exists(_claude_bin):
+        return
+    _claude_bin = shutil.which("claude") or _prepend_to_path(_KNOWN_CLAUDE_PATHS)
+    if _claude_bin:
         return
-    known_paths = [Path.home() / ".local" / "bin" / "claude"]
-    if platform.system() != "Windows":
-        known_paths.append(Path("/usr/local/bin/claude"))
-    for p in known_paths:
-        if p.exists():
-            os.environ["PATH"] = f"{p.parent}:{os.environ.get('PATH', '')}"
-            return
     print("Claude Code CLI not found. Installing...")
     try:
         subprocess.run(
@@ -228,42 +317,183 @@ def _ensure_claude_cli():
             "Install it manually: https://docs.anthropic.com/en/docs/claude-code"
         ) from e
     # Add the newly installed binary to PATH
-    for p in known_paths:
-        if p.exists():
-            os.environ["PATH"] = f"{p.parent}:{os.environ.get('PATH', '')}"
-            return
+    _claude_bin = _prepend_to_path(_KNOWN_CLAUDE_PATHS)
 
 
-def _atomic_write_log(path: Path, data: dict):
+# Every log field except the conversation is also written to a small
+# "<id>.log.hdr" sidecar, so status and the web UI's listings never parse
+# the transcript. Older sidecars only carry these status fields.
+_LOG_HEADER_FIELDS = ("timestamp", "mode", "agent_name", "duration_seconds", "error")
+
+
+def _atomic_write_json(path: Path, data: dict):
     fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
     try:
-        with os.fdopen(fd, "w") as f:
-            json.dump(data, f, indent=2, default=str)
-        os.rename(tmp, path)
+        with os.fdopen(fd, "wb") as f:
+            jsonio.dump(data, f, default=str)
+        os.replace(tmp, path)
     except BaseException:
         os.unlink(tmp)
         raise
 
 
-def _find_session_for_thread(config: Config, thread_id: str, agent_name: str) -> str | None:
-    """Find the session_id from the most recent log for a given thread and agent."""
-    log_files = sorted(
-        config.logs_dir.glob("*.log"),
-        key=lambda p: p.stat().st_mtime,
-        reverse=True,
-    )
-    for lf in log_files:
+def _atomic_write_log(path: Path, data: dict):
+    # Header first, so an existing log always has its sidecar.
+    header = {k: v for k, v in data.items() if k not in LOG_BODY_FIELDS}
+    _atomic_write_json(path.with_name(path.name + ".hdr"), header)
+    _atomic_write_json(path, data)
+
+
+def _thread_key(thread_id: str, agent_name: str) -> str:
+    return f"{thread_id}|{agent_name}"
+
+
+# threads.jsonl holds one {"k": "thread_id|agent_name", "s": session_id}
+# record per line; later lines win. Appends are read incrementally.
+# Every rewrite starts with a {"generation": <random hex>} line, and a
+# reader only resumes at its offset while the first line is unchanged:
+# the rewritten file may reuse the old inode.
+# Cached as (inode, bytes consumed, line count, index, first line).
+_thread_index_cache: tuple[int, int, int, dict[str, str], bytes] | None = None
+
+
+def _parse_thread_lines(chunk: bytes, index: dict[str, str]) -> int:
+    n = 0
+    for line in chunk.splitlines():
         try:
-            data = json.loads(lf.read_text())
-            if (
-                data.get("thread_id") == thread_id
-                and data.get("agent_name") == agent_name
-                and data.get("session_id")
-            ):
-                return data["session_id"]
-        except Exception:
+            rec = jsonio.loads(line)
+            index[rec["k"]] = rec["s"]
+        except (jsonio.JSONDecodeError, KeyError, TypeError):
             continue
-    return None
+        n += 1
+    return n
+
+
+def _load_thread_index(config: Config) -> dict[str, str] | None:
+    """Return the "thread_id|agent_name" -> session_id index, or None if absent."""
+    global _thread_index_cache
+    try:
+        f = open(config.thread_index_file, "rb")
+    except FileNotFoundError:
+        return None
+    with f:
+        st = os.fstat(f.fileno())
+        head = f.readline()
+        cached = _thread_index_cache
+        if (
+            cached is not None
+            and cached[0] == st.st_ino
+            and cached[1] <= st.st_size
+            and cached[4] == head
+        ):
+            if cached[1] == st.st_size:
+                return cached[3]
+            _, offset, lines, index, _ = cached
+            index = dict(index)
+            f.seek(offset)
+        else:
+            offset, lines, index = 0, 0, {}
+            f.seek(0)
+        chunk = f.read()
+    # Leave a partially written last line for the next read.
+    keep = chunk.rfind(b"\n") + 1
+    lines += _parse_thread_lines(chunk[:keep], index)
+    if not head.endswith(b"\n"):
+        head = b""  # Still being written; compare again next time.
+    _thread_index_cache = (st.st_ino, offset + keep, lines, index, head)
+    return index
+
+
+def _write_thread_index(config: Config, index: dict[str, str]):
+    """Rewrite threads.jsonl compactly; callers hold its lock."""
+    path = config.thread_index_file
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(jsonio.dumps({"generation": os.urandom(8).hex()}) + b"\n")
+            for k, sid in index.items():
+                f.write(jsonio.dumps({"k": k, "s": sid}))
+                f.write(b"\n")
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _read_log_quietly(entry: os.DirEntry) -> dict | None:
+    try:
+        with open(entry.path, "rb") as f:
+            data = jsonio.loads(f.read())
+    except Exception:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _scan_thread_sessions(config: Config) -> dict[str, str]:
+    """Rebuild the thread index from the logs (newest log wins per thread)."""
+    index: dict[str, str] = {}
+    # Reads overlap on a small pool; map() keeps newest-first order, so the
+    # first session seen for a thread is the one kept.
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as ex:
+        for data in ex.map(_read_log_quietly, logs_newest_first(config.logs_dir)):
+            if data and data.get("thread_id") and data.get("agent_name") and data.get("session_id"):
+                index.setdefault(_thread_key(data["thread_id"], data["agent_name"]), data["session_id"])
+    return index
+
+
+def _ensure_thread_index(config: Config) -> dict[str, str]:
+    index = _load_thread_index(config)
+    if index is not None:
+        return index
+    # First use in this workspace: migrate from a one-off scan of the logs.
+    with _flock(config.thread_index_file):
+        index = _load_thread_index(config)
+        if index is None:
+            index = _scan_thread_sessions(config)
+            _write_thread_index(config, index)
+    return index
+
+
+def _record_thread_session(config: Config, thread_id: str, agent_name: str, session_id: str):
+    key = _thread_key(thread_id, agent_name)
+    with _flock(config.thread_index_file):
+        index = _load_thread_index(config)
+        if index is None:
+            index = _scan_thread_sessions(config)
+            index[key] = session_id
+            _write_thread_index(config, index)
+            return
+        if index.get(key) == session_id:
+            return
+        lines = _thread_index_cache[2]
+        if lines > 2 * len(index) + 64:
+            # Mostly superseded records: compact instead of appending.
+            _write_thread_index(config, {**index, key: session_id})
+            return
+        with open(config.thread_index_file, "ab") as f:
+            f.write(jsonio.dumps({"k": key, "s": session_id}) + b"\n")
+
+
+def _find_session_for_thread(config: Config, thread_id: str, agent_name: str) -> str | None:
+    """Find the session_id of the most recent invocation for a thread and agent."""
+    return _ensure_thread_index(config).get(_thread_key(thread_id, agent_name))
+
+
+# invoke.py path -> ((mtime_ns, size), module); edits reload on next call.
+_invoke_module_cache: dict[str, tuple[tuple[int, int], ModuleType]] = {}
+
+
+def _load_invoke_module(invoke_file: Path) -> ModuleType:
+    st = invoke_file.stat()
+    key = (st.st_mtime_ns, st.st_size)
+    cached = _invoke_module_cache.get(str(invoke_file))
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    spec = importlib.util.spec_from_file_location("agent_invoke", invoke_file)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    _invoke_module_cache[str(invoke_file)] = (key, mod)
+    return mod
 
 
 async def _custom_invoke(
@@ -274,9 +504,9 @@ async def _custom_invoke(
     config_path: Path,
 ) -> InvocationResult:
     """Load and call an agent's custom invoke.py."""
-    spec = importlib.util.spec_from_file_location("agent_invoke", invoke_file)
-    mod = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(mod)
+    from freza.llm import InvocationResult
+
+    mod = _load_invoke_module(invoke_file)
 
     if not hasattr(mod, "invoke"):
         raise RuntimeError(f"{invoke_file} does not define an 'invoke' function")
@@ -294,7 +524,6 @@ async def _custom_invoke(
         response=response,
         duration_seconds=duration,
         cost_usd=0.0,
-        tools_used=[],
         turns=1,
         session_id=None,
         conversation=[],
@@ -308,11 +537,14 @@ async def do_invoke(
     trigger_message: str | None = None,
     thread_id: str | None = None,
     agent_name: str = "default",
+    channel_record: dict | None = None,
 ):
+    from freza.llm import invoke_claude, LLMError
+
     _ensure_claude_cli()
-    agents = AgentManager(config)
-    registry = InstanceRegistry(config)
-    channels = ChannelManager(config)
+    agents = _agents(config)
+    registry = _registry(config)
+    channels = _channels(config)
 
     agent_name = validate_agent_name(agent_name)
     agent_config = agents.get_agent_config(agent_name)
@@ -323,7 +555,8 @@ async def do_invoke(
         )
     memory = MemoryManager(config, agent_name=agent_name)
 
-    instance = registry.register(
+    instance = await asyncio.to_thread(
+        registry.register,
         mode=mode,
         channel_name=channel_name,
         trigger_message=trigger_message,
@@ -331,7 +564,7 @@ async def do_invoke(
     )
     print(f"[{instance.instance_id}] registered (mode={mode}, agent={agent_name}, pid={instance.pid})")
 
-    memory.write_short_term(instance.instance_id, {
+    await asyncio.to_thread(memory.write_short_term, instance.instance_id, {
         "instance_id": instance.instance_id,
         "mode": mode,
         "agent_name": agent_name,
@@ -349,7 +582,8 @@ async def do_invoke(
     try:
         channel_prompt = None
         if mode == "channel" and channel_name:
-            ch_record = channels.get_channel(channel_name)
+            # main() passes the record it already looked up for the agent.
+            ch_record = channel_record or channels.get_channel(channel_name)
             if ch_record:
                 channel_prompt = ch_record.get("system_prompt")
 
@@ -364,7 +598,9 @@ async def do_invoke(
             instance, agent_name, mode, channel_name, trigger_message,
         )
 
-        memory.update_short_term(instance.instance_id, current_task="thinking")
+        await asyncio.to_thread(
+            memory.update_short_term, instance.instance_id, current_task="thinking"
+        )
 
         # Check for custom invoke.py
         invoke_file = config.agent_invoke_file(agent_name)
@@ -382,7 +618,9 @@ async def do_invoke(
             # Look up prior session for multi-turn threads
             resume_session = None
             if thread_id:
-                resume_session = _find_session_for_thread(config, thread_id, agent_name)
+                resume_session = await asyncio.to_thread(
+                    _find_session_for_thread, config, thread_id, agent_name
+                )
                 if resume_session:
                     print(f"[{instance.instance_id}] resuming thread {thread_id} "
                           f"(session={resume_session[:12]}...)")
@@ -397,7 +635,10 @@ async def do_invoke(
                     print(text, end="", flush=True)
 
                 def stream_event(event: dict) -> None:
-                    print(f"\x1e{json.dumps(event, default=str)}", flush=True)
+                    # Bytes straight to the buffer: UTF-8 whatever the locale.
+                    sys.stdout.flush()
+                    sys.stdout.buffer.write(b"\x1e" + jsonio.dumps(event, default=str) + b"\n")
+                    sys.stdout.buffer.flush()
 
             result = await invoke_claude(
                 prompt=user,
@@ -413,6 +654,8 @@ async def do_invoke(
             if stream_text:
                 print()
 
+        # Custom invoke modules may still report a plain list of names.
+        tool_counts = Counter(result.tools_used)
         log_entry = {
             "instance_id": instance.instance_id,
             "mode": mode,
@@ -422,16 +665,22 @@ async def do_invoke(
             "response": result.response[:5000],
             "duration_seconds": result.duration_seconds,
             "cost_usd": result.cost_usd,
-            "tools_used": result.tools_used,
+            "tools_used": list(tool_counts),
+            "tool_counts": dict(tool_counts),
             "turns": result.turns,
             "timestamp": time.time(),
             "session_id": result.session_id,
             "thread_id": thread_id,
             "conversation": result.conversation,
         }
-        _atomic_write_log(log_file, log_entry)
+        await asyncio.to_thread(_atomic_write_log, log_file, log_entry)
+        if thread_id and result.session_id:
+            await asyncio.to_thread(
+                _record_thread_session, config, thread_id, agent_name, result.session_id
+            )
 
-        memory.update_short_term(
+        await asyncio.to_thread(
+            memory.update_short_term,
             instance.instance_id,
             current_task="complete",
             status="finished",
@@ -442,34 +691,37 @@ async def do_invoke(
 
         print(f"[{instance.instance_id}] done "
               f"({result.duration_seconds:.1f}s, ${result.cost_usd:.4f}, "
-              f"{result.turns} turns, tools: {result.tools_used})")
+              f"{result.turns} turns, tools: {dict(tool_counts)})")
 
         if mode != "channel":
-            for line in result.response.splitlines()[:10]:
+            lines = result.response.splitlines()
+            for line in lines[:10]:
                 print(f"  {line}")
-            if len(result.response.splitlines()) > 10:
-                print(f"  ... ({len(result.response.splitlines())} lines total)")
+            if len(lines) > 10:
+                print(f"  ... ({len(lines)} lines total)")
 
     except LLMError as e:
         final_status = "failed"
         print(f"[{instance.instance_id}] error: {e}", file=sys.stderr)
-        memory.update_short_term(
+        await asyncio.to_thread(
+            memory.update_short_term,
             instance.instance_id,
             current_task="failed",
             status="failed",
             error=str(e),
         )
-        log_file.write_text(json.dumps({
+        await asyncio.to_thread(_atomic_write_log, log_file, {
             "instance_id": instance.instance_id,
             "agent_name": agent_name,
             "error": str(e),
             "timestamp": time.time(),
-        }, indent=2))
+        })
 
     except Exception as e:
         final_status = "failed"
         traceback.print_exc()
-        memory.update_short_term(
+        await asyncio.to_thread(
+            memory.update_short_term,
             instance.instance_id,
             current_task="failed",
             status="failed",
@@ -478,25 +730,36 @@ async def do_invoke(
 
     finally:
         registry.stop_heartbeat()
-        registry.deregister(instance.instance_id, status=final_status)
+        await asyncio.to_thread(
+            registry.deregister, instance.instance_id, status=final_status
+        )
         print(f"[{instance.instance_id}] deregistered")
 
 
 def do_cleanup(config: Config):
-    registry = InstanceRegistry(config)
-    active_ids = {i.instance_id for i in registry.get_active()}
-    if not config.short_term_dir.exists():
+    # List first: a file created after this pass belongs to an instance that
+    # registered after it, so nothing live can be missed by reading the
+    # registry afterwards.
+    try:
+        with os.scandir(config.short_term_dir) as it:
+            files = {e.name[:-5]: e.path for e in it if e.name.endswith(".json")}
+    except FileNotFoundError:
+        return
+    if not files:
         return
-    for f in config.short_term_dir.glob("*.json"):
-        if f.stem not in active_ids:
-            f.unlink(missing_ok=True)
+    active_ids = {i.instance_id for i in _registry(config).get_active()}
+    for instance_id in files.keys() - active_ids:
+        try:
+            os.unlink(files[instance_id])
+        except FileNotFoundError:
+            pass
 
 
 def do_init(config: Config):
     config.initialize()
 
     # Auto-register the webui channel with default agent
-    channels = ChannelManager(config)
+    channels = _channels(config)
     channels.register("webui", "Web UI chat interface", default_agent="default")
 
     # Auto-start the webui daemon
@@ -515,105 +778,123 @@ def do_init(config: Config):
     print(f"  freza status")
 
 
+@functools.lru_cache(maxsize=256)
+def _parse_log_header(path: str, mtime_ns: int, size: int) -> dict:
+    """Parse a log once per (path, mtime, size) and keep only the status fields."""
+    with open(path, "rb") as f:
+        data = jsonio.loads(f.read())
+    return {k: data[k] for k in _LOG_HEADER_FIELDS if k in data}
+
+
+def _log_header(entry: os.DirEntry) -> dict:
+    try:
+        with open(entry.path + ".hdr", "rb") as f:
+            return jsonio.loads(f.read())
+    except (FileNotFoundError, jsonio.JSONDecodeError):
+        # Logs written before header sidecars existed.
+        st = entry.stat()
+        return _parse_log_header(entry.path, st.st_mtime_ns, st.st_size)
+
+
 def do_status(config: Config):
     config.ensure_dirs()
 
-    registry = InstanceRegistry(config)
-    channels = ChannelManager(config)
-    agents = AgentManager(config)
+    registry = _registry(config)
+    channels = _channels(config)
+    agents = _agents(config)
 
     instances = registry.get_active()
     chan_list = channels.list_channels()
     agent_list = agents.list_agents()
 
-    print("=" * 50)
-    print("  Freza Status")
-    print("=" * 50)
+    # Build the whole report and write it once rather than per line.
+    out: list[str] = []
+    out.append("=" * 50)
+    out.append("  Freza Status")
+    out.append("=" * 50)
 
     # Agents section
-    print(f"\n  Agents: {len(agent_list)}")
+    out.append(f"\n  Agents: {len(agent_list)}")
     for a in agent_list:
         name = a["name"]
         mem_file = config.agent_memory_file(name)
         invoke_file = config.agent_invoke_file(name)
-        mem_info = ""
-        if mem_file.exists():
-            mem_text = mem_file.read_text()
-            mem_lines = mem_text.strip().splitlines()
-            mem_info = f"{len(mem_lines)} lines, {len(mem_text)} bytes"
+        try:
+            mem_data = mem_file.read_bytes()
+        except FileNotFoundError:
+            mem_data = None
+        if mem_data is not None:
+            body = mem_data.strip()
+            mem_line_count = body.count(b"\n") + 1 if body else 0
+            mem_info = f"{mem_line_count} lines, {len(mem_data)} bytes"
         else:
             mem_info = "no memory"
         invoke_info = " [custom invoke.py]" if invoke_file.exists() else ""
-        print(f"    {name}: {a.get('description', '')}")
-        print(f"      memory: {mem_info}{invoke_info}")
-
-        # Show memory preview
-        if mem_file.exists():
-            mem_text = mem_file.read_text()
-            mem_lines = mem_text.strip().splitlines()
-            for line in mem_lines[:3]:
-                print(f"        {line}")
-            if len(mem_lines) > 3:
-                print(f"        ... ({len(mem_lines) - 3} more lines)")
+        out.append(f"    {name}: {a.get('description', '')}")
+        out.append(f"      memory: {mem_info}{invoke_info}")
+
+        # Show memory preview; only the head needs decoding.
+        if mem_data is not None:
+            preview = body[:4096].decode(errors="replace").splitlines()[:3]
+            for line in preview:
+                out.append(f"        {line}")
+            if mem_line_count > 3:
+                out.append(f"        ... ({mem_line_count - 3} more lines)")
     if not agent_list:
-        print("    (none)")
+        out.append("    (none)")
 
-    print(f"\n  Active instances: {len(instances)}")
+    out.append(f"\n  Active instances: {len(instances)}")
     if instances:
         # Use default agent for short-term reads
         memory = MemoryManager(config, agent_name="default")
+        states = memory.get_all_short_term({i.instance_id for i in instances})
+        now = time.time()
         for inst in instances:
-            st = memory.read_short_term(inst.instance_id)
+            st = states.get(inst.instance_id)
             task = st.get("current_task", "?") if st else "?"
-            age = time.time() - inst.started_at
-            print(
+            age = now - inst.started_at
+            out.append(
                 f"    {inst.instance_id}  mode={inst.mode:8s}  "
                 f"agent={inst.agent_name:12s}  "
                 f"task={task:20s}  uptime={age:.0f}s  pid={inst.pid}"
             )
     else:
-        print("    (none)")
+        out.append("    (none)")
 
     from freza.daemon import is_running
     webui_pid = is_running(config)
     if webui_pid:
-        print(f"\n  WebUI daemon: running (PID {webui_pid})")
+        out.append(f"\n  WebUI daemon: running (PID {webui_pid})")
     else:
-        print(f"\n  WebUI daemon: not running")
+        out.append(f"\n  WebUI daemon: not running")
 
-    print(f"\n  Channels: {len(chan_list)}")
+    out.append(f"\n  Channels: {len(chan_list)}")
     for ch in chan_list:
         prompt_info = ""
         sp = ch.get("system_prompt")
         if sp:
             prompt_info = f"  [custom prompt: {len(sp)} chars]"
         default_agent = ch.get("default_agent", "default")
-        print(f"    {ch['name']}: {ch.get('description', '')} (agent={default_agent}){prompt_info}")
+        out.append(f"    {ch['name']}: {ch.get('description', '')} (agent={default_agent}){prompt_info}")
     if not chan_list:
-        print("    (none)")
+        out.append("    (none)")
 
-    print(f"\n  Recent logs:")
-    log_files = sorted(
-        config.logs_dir.glob("*.log"),
-        key=lambda p: p.stat().st_mtime,
-        reverse=True,
-    )
-    for lf in log_files[:5]:
+    out.append(f"\n  Recent logs:")
+    for entry in logs_newest_first(config.logs_dir, limit=5):
         try:
-            data = json.loads(lf.read_text())
-            ts = datetime.fromtimestamp(
-                data.get("timestamp", 0), timezone.utc
-            ).strftime("%H:%M:%S")
+            data = _log_header(entry)
+            ts = time.strftime("%H:%M:%S", time.gmtime(data.get("timestamp", 0)))
             mode = data.get("mode", "?")
             agent = data.get("agent_name", "?")
             dur = data.get("duration_seconds", 0)
             err = data.get("error")
             status = "X" if err else "OK"
-            print(f"    {status} {ts} mode={mode} agent={agent} {dur:.1f}s  {lf.stem}")
+            out.append(f"    {status} {ts} mode={mode} agent={agent} {dur:.1f}s  {entry.name[:-4]}")
         except Exception:
             pass
 
-    print()
+    out.append("")
+    sys.stdout.write("\n".join(out) + "\n")
 
 
 def main():
@@ -710,7 +991,7 @@ def main():
 
     elif args.command == "register-channel":
         config.ensure_dirs()
-        cm = ChannelManager(config)
+        cm = _channels(config)
         kwargs = {}
         if args.system_prompt is not None:
             prompt_val = args.system_prompt
@@ -719,7 +1000,7 @@ def main():
             kwargs["system_prompt"] = prompt_val
         if args.default_agent is not None:
             default_agent = validate_agent_name(args.default_agent)
-            am = AgentManager(config)
+            am = _agents(config)
             if not am.get_agent_config(default_agent):
                 raise ValueError(
                     f"Unknown default agent '{default_agent}'. Register it first with:\n"
@@ -735,7 +1016,7 @@ def main():
 
     elif args.command == "register-agent":
         config.ensure_dirs()
-        am = AgentManager(config)
+        am = _agents(config)
         kwargs = {}
         if args.system_prompt is not None:
             prompt_val = args.system_prompt
@@ -768,10 +1049,9 @@ def main():
         do_cleanup(config)
 
         # Resolve agent: explicit --agent flag > channel's default_agent > "default"
+        ch_record = _channels(config).get_channel(args.channel_name)
         agent_name = args.agent
         if not agent_name:
-            cm = ChannelManager(config)
-            ch_record = cm.get_channel(args.channel_name)
             if ch_record:
                 agent_name = ch_record.get("default_agent", "default")
             else:
@@ -784,6 +1064,7 @@ def main():
                 trigger_message=args.message,
                 thread_id=args.thread_id,
                 agent_name=agent_name,
+                channel_record=ch_record,
             ))
         except ValueError as e:
             print(f"Error: {e}", file=sys.stderr)
@@ -4,6 +4,7 @@ import os
 import platform
 import secrets
 import sys
+from functools import cached_property
 from pathlib import Path
 
 
@@ -32,30 +33,97 @@ I am "{agent_name}", an autonomous agent. I persist across invocations and maint
 
 
 class Config:
+    # Paths and settings are computed on first use: resolving the base
+    # directory stats every path component, and most commands only touch
+    # a few of these.
     def __init__(self, base_dir: str | None = None):
-        self.base_dir = Path(
-            base_dir or os.environ.get("AGENT_BASE_DIR", str(default_base_dir()))
+        self._base_dir_arg = base_dir
+
+    @cached_property
+    def base_dir(self) -> Path:
+        return Path(
+            self._base_dir_arg or os.environ.get("AGENT_BASE_DIR", str(default_base_dir()))
         ).resolve()
 
-        self.state_dir = self.base_dir / "state"
-        self.registry_file = self.state_dir / "registry.json"
-        self.short_term_dir = self.state_dir / "short_term"
-        self.channels_dir = self.base_dir / "channels"
-        self.channels_meta = self.state_dir / "channels.json"
-        self.agents_dir = self.base_dir / "agents"
-        self.agents_meta = self.state_dir / "agents.json"
-        self.logs_dir = self.state_dir / "logs"
-        self.tools_dir = self.base_dir / "tools"
-        self.webui_pid_file = self.state_dir / "webui.pid"
-        self.webui_log_file = self.state_dir / "webui.log"
-        self.webui_token_file = self.state_dir / "webui.token"
-
-        self.heartbeat_interval = int(os.environ.get("AGENT_HEARTBEAT_SEC", "30"))
-        self.stale_threshold = int(os.environ.get("AGENT_STALE_SEC", "300"))
-
-        self.model = os.environ.get("AGENT_MODEL", "claude-opus-4-6")
-        self.max_turns = int(os.environ.get("AGENT_MAX_TURNS", "100"))
-        self.timeout = int(os.environ.get("AGENT_TIMEOUT_SEC", "600"))
+    @cached_property
+    def state_dir(self) -> Path:
+        return self.base_dir / "state"
+
+    @cached_property
+    def registry_file(self) -> Path:
+        return self.state_dir / "registry.jsonl"
+
+    @cached_property
+    def heartbeat_dir(self) -> Path:
+        return self.state_dir / "heartbeats"
+
+    @cached_property
+    def short_term_dir(self) -> Path:
+        return self.state_dir / "short_term"
+
+    @cached_property
+    def channels_dir(self) -> Path:
+        return self.base_dir / "channels"
+
+    @cached_property
+    def channels_meta(self) -> Path:
+        return self.state_dir / "channels.json"
+
+    @cached_property
+    def agents_dir(self) -> Path:
+        return self.base_dir / "agents"
+
+    @cached_property
+    def agents_meta(self) -> Path:
+        return self.state_dir / "agents.json"
+
+    @cached_property
+    def logs_dir(self) -> Path:
+        return self.state_dir / "logs"
+
+    @cached_property
+    def thread_index_file(self) -> Path:
+        return self.state_dir / "threads.jsonl"
+
+    @cached_property
+    def tools_dir(self) -> Path:
+        return self.base_dir / "tools"
+
+    @cached_property
+    def webui_pid_file(self) -> Path:
+        return self.state_dir / "webui.pid"
+
+    @cached_property
+    def webui_log_file(self) -> Path:
+        return self.state_dir / "webui.log"
+
+    @cached_property
+    def webui_token_file(self) -> Path:
+        return self.state_dir / "webui.token"
+
+    @cached_property
+    def heartbeat_interval(self) -> int:
+        return int(os.environ.get("AGENT_HEARTBEAT_SEC", "30"))
+
+    @cached_property
+    def stale_threshold(self) -> int:
+        return int(os.environ.get("AGENT_STALE_SEC", "300"))
+
+    @cached_property
+    def model(self) -> str:
+        return os.environ.get("AGENT_MODEL", "claude-opus-4-6")
+
+    @cached_property
+    def max_turns(self) -> int:
+        return int(os.environ.get("AGENT_MAX_TURNS", "100"))
+
+    @cached_property
+    def timeout(self) -> int:
+        return int(os.environ.get("AGENT_TIMEOUT_SEC", "600"))
+
+    @cached_property
+    def webui_prefork(self) -> bool:
+        return os.environ.get("AGENT_WEBUI_PREFORK", "0") == "1"
 
     def agent_dir(self, name: str) -> Path:
         return self.agents_dir / name
@@ -90,6 +158,7 @@ class Config:
     def ensure_dirs(self):
         for d in (
             self.state_dir,
+            self.heartbeat_dir,
             self.short_term_dir,
             self.channels_dir,
             self.agents_dir,
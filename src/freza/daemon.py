@@ -3,6 +3,7 @@
 from __future__ import annotations
 
 import os
+import select
 import signal
 import sys
 import time
@@ -34,6 +35,30 @@ def is_running(config: Config) -> int | None:
     return pid
 
 
+def _wait_for_exit(pid: int, timeout: float) -> bool:
+    """Wait for *pid* to exit. Returns True if it did within *timeout*."""
+    try:
+        pidfd = os.pidfd_open(pid)
+    except ProcessLookupError:
+        return True
+    except (AttributeError, OSError):
+        # No pidfd (macOS, Linux < 5.3): poll instead.
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                return True
+            time.sleep(0.1)
+        return False
+    try:
+        # The pidfd becomes readable when the process exits.
+        readable, _, _ = select.select([pidfd], [], [], timeout)
+        return bool(readable)
+    finally:
+        os.close(pidfd)
+
+
 def stop_daemon(config: Config) -> bool:
     """Stop the webui daemon. Returns True if a process was stopped."""
     pid = is_running(config)
@@ -45,13 +70,7 @@ def stop_daemon(config: Config) -> bool:
         config.webui_pid_file.unlink(missing_ok=True)
         return False
     # Wait up to 2 seconds for graceful shutdown
-    for _ in range(20):
-        try:
-            os.kill(pid, 0)
-        except ProcessLookupError:
-            break
-        time.sleep(0.1)
-    else:
+    if not _wait_for_exit(pid, 2.0):
         # Still alive -- force kill
         try:
             os.kill(pid, signal.SIGKILL)
@@ -74,21 +93,27 @@ def daemonize(config: Config, host: str = "127.0.0.1", port: int = 7888, token:
     pid_file = config.webui_pid_file
     log_file = config.webui_log_file
 
+    # The grandchild reports its PID back through this pipe.
+    ready_r, ready_w = os.pipe()
+
     # First fork
     pid = os.fork()
     if pid > 0:
-        # Parent: wait briefly for grandchild PID file to appear
-        for _ in range(30):
-            if pid_file.exists():
-                try:
-                    return int(pid_file.read_text().strip())
-                except (ValueError, OSError):
-                    pass
-            time.sleep(0.1)
+        # Parent: wait briefly for the grandchild to report in
+        os.close(ready_w)
+        try:
+            readable, _, _ = select.select([ready_r], [], [], 3.0)
+            if readable:
+                return int(os.read(ready_r, 32))
+        except (ValueError, OSError):
+            pass
+        finally:
+            os.close(ready_r)
         # Fallback: return child PID
         return pid
 
     # First child: create new session
+    os.close(ready_r)
     os.setsid()
 
     # Second fork
@@ -99,6 +124,8 @@ def daemonize(config: Config, host: str = "127.0.0.1", port: int = 7888, token:
 
     # Grandchild: this is the daemon
     pid_file.write_text(str(os.getpid()))
+    os.write(ready_w, str(os.getpid()).encode())
+    os.close(ready_w)
 
     # Redirect stdio to log file
     log_fd = os.open(str(log_file), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
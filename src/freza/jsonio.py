@@ -0,0 +1,62 @@
+"""JSON encode/decode helpers -- orjson when installed, stdlib json otherwise."""
+
+from __future__ import annotations
+
+import io
+import json
+from collections.abc import Callable
+from typing import IO, Any
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+# orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers can keep
+# catching the stdlib exception regardless of which backend is active.
+JSONDecodeError = json.JSONDecodeError
+
+
+def loads(data: bytes | str) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(
+    obj: Any,
+    *,
+    indent: bool = False,
+    default: Callable[[Any], Any] | None = None,
+) -> bytes:
+    if orjson is not None:
+        # Non-str keys are stringified like the stdlib encoder does.
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(obj, default=default, option=option)
+        except TypeError:
+            # orjson rejects some values the stdlib takes (integers past
+            # 64 bits); fall through rather than fail the write.
+            pass
+    return json.dumps(obj, indent=2 if indent else None, default=default).encode()
+
+
+def dump(
+    obj: Any,
+    fp: IO[bytes],
+    *,
+    indent: bool = False,
+    default: Callable[[Any], Any] | None = None,
+):
+    """Serialize *obj* into the binary file *fp*."""
+    if orjson is not None:
+        fp.write(dumps(obj, indent=indent, default=default))
+        return
+    # Stream through the stdlib encoder instead of building the whole string.
+    w = io.TextIOWrapper(fp, encoding="utf-8", write_through=True)
+    try:
+        json.dump(obj, w, indent=2 if indent else None, default=default)
+    finally:
+        w.detach()
@@ -2,9 +2,10 @@
 
 from __future__ import annotations
 
-import json
+import io
 import os
 import time
+from collections import Counter, deque
 from collections.abc import Callable
 from dataclasses import dataclass, field
 
@@ -23,6 +24,8 @@ from claude_agent_sdk import (
     query,
 )
 
+from freza import jsonio
+
 # Patch the parser to tolerate unknown message types (e.g. rate_limit_event)
 # instead of crashing the stream.
 _original_parse = _client.parse_message
@@ -38,6 +41,8 @@ def _tolerant_parse(data):
 _client.parse_message = _tolerant_parse
 
 MAX_CONTENT_LENGTH = int(os.environ.get("AGENT_LOG_MAX_CONTENT", 500_000))
+# Only the most recent messages of a conversation are kept for the log.
+MAX_CONVERSATION_MESSAGES = int(os.environ.get("AGENT_LOG_MAX_MESSAGES", 10_000))
 
 
 def _truncate(text: str) -> tuple[str, dict]:
@@ -46,77 +51,159 @@ def _truncate(text: str) -> tuple[str, dict]:
     return text[:MAX_CONTENT_LENGTH], {"truncated": True, "original_length": len(text)}
 
 
-def _serialize_content_block(block) -> dict | None:
-    if isinstance(block, TextBlock):
-        text, extra = _truncate(block.text)
-        return {"type": "text", "text": text, **extra}
-    if isinstance(block, ThinkingBlock):
-        thinking, extra = _truncate(block.thinking)
-        return {"type": "thinking", "thinking": thinking, "signature": block.signature, **extra}
-    if isinstance(block, ToolUseBlock):
-        inp = json.dumps(block.input, default=str)
+def _serialize_text(block: TextBlock) -> dict:
+    text, extra = _truncate(block.text)
+    return {"type": "text", "text": text, **extra}
+
+
+def _serialize_thinking(block: ThinkingBlock) -> dict:
+    thinking, extra = _truncate(block.thinking)
+    return {"type": "thinking", "thinking": thinking, "signature": block.signature, **extra}
+
+
+def _encoded_length_bound(data) -> int | None:
+    """Upper bound on the JSON length of a flat dict of scalars, else None.
+
+    No character encodes to more than twelve: the stdlib encoder escapes
+    non-ASCII, and a code point outside the BMP becomes a surrogate pair
+    (``\\uXXXX\\uXXXX``). Still tight enough to show that typical tool
+    inputs fit without encoding them.
+    """
+    if not isinstance(data, dict):
+        return None
+    total = 2
+    for k, v in data.items():
+        if not isinstance(k, str):
+            return None
+        if isinstance(v, str):
+            n = len(v)
+        elif v is None or isinstance(v, (bool, float)):
+            n = 24
+        elif isinstance(v, int):
+            n = len(str(v))
+        else:
+            return None
+        total += 12 * (len(k) + n) + 6
+    return total
+
+
+def _serialize_tool_use(block: ToolUseBlock) -> dict:
+    bound = _encoded_length_bound(block.input)
+    if bound is not None and bound <= MAX_CONTENT_LENGTH:
+        return {"type": "tool_use", "id": block.id, "name": block.name, "input": block.input}
+    # The encoded byte length bounds the character length, so only
+    # oversized inputs are decoded for truncation.
+    encoded = jsonio.dumps(block.input, default=str)
+    if len(encoded) > MAX_CONTENT_LENGTH:
+        inp = encoded.decode()
         if len(inp) > MAX_CONTENT_LENGTH:
             return {
                 "type": "tool_use", "id": block.id, "name": block.name,
                 "input": inp[:MAX_CONTENT_LENGTH],
                 "truncated": True, "original_length": len(inp),
             }
-        return {"type": "tool_use", "id": block.id, "name": block.name, "input": block.input}
-    if isinstance(block, ToolResultBlock):
-        content = block.content
-        extra = {}
-        if isinstance(content, str):
-            content, extra = _truncate(content)
-        elif isinstance(content, list):
-            content = json.dumps(content, default=str)
-            content, extra = _truncate(content)
-        return {
-            "type": "tool_result", "tool_use_id": block.tool_use_id,
-            "content": content, "is_error": block.is_error, **extra,
-        }
+    return {"type": "tool_use", "id": block.id, "name": block.name, "input": block.input}
+
+
+def _serialize_tool_result(block: ToolResultBlock) -> dict:
+    content = block.content
+    extra = {}
+    if isinstance(content, str):
+        content, extra = _truncate(content)
+    elif isinstance(content, list):
+        content = jsonio.dumps(content, default=str).decode()
+        content, extra = _truncate(content)
+    return {
+        "type": "tool_result", "tool_use_id": block.tool_use_id,
+        "content": content, "is_error": block.is_error, **extra,
+    }
+
+
+_BLOCK_SERIALIZERS: dict[type, Callable[[object], dict]] = {
+    TextBlock: _serialize_text,
+    ThinkingBlock: _serialize_thinking,
+    ToolUseBlock: _serialize_tool_use,
+    ToolResultBlock: _serialize_tool_result,
+}
+
+
+def _dispatch(table: dict[type, Callable], obj) -> Callable | None:
+    # Exact type first (one dict lookup); subclasses resolve through the MRO
+    # and are cached for next time.
+    handler = table.get(type(obj))
+    if handler is None:
+        for cls in type(obj).__mro__[1:]:
+            handler = table.get(cls)
+            if handler is not None:
+                table[type(obj)] = handler
+                break
+    return handler
+
+
+def _serialize_content_block(block) -> dict | None:
+    handler = _dispatch(_BLOCK_SERIALIZERS, block)
+    if handler is not None:
+        return handler(block)
     return {"type": type(block).__name__, "data": str(block)}
 
 
-def _serialize_message(message) -> dict | None:
-    if isinstance(message, AssistantMessage):
+def _serialize_assistant(message: AssistantMessage) -> dict:
+    blocks = [_serialize_content_block(b) for b in message.content]
+    d = {"role": "assistant", "model": message.model, "content": [b for b in blocks if b]}
+    if message.parent_tool_use_id:
+        d["parent_tool_use_id"] = message.parent_tool_use_id
+    if getattr(message, "error", None):
+        d["error"] = message.error
+    return d
+
+
+def _serialize_user(message: UserMessage) -> dict:
+    if isinstance(message.content, list):
         blocks = [_serialize_content_block(b) for b in message.content]
-        d = {"role": "assistant", "model": message.model, "content": [b for b in blocks if b]}
-        if message.parent_tool_use_id:
-            d["parent_tool_use_id"] = message.parent_tool_use_id
-        if getattr(message, "error", None):
-            d["error"] = message.error
-        return d
-    if isinstance(message, UserMessage):
-        if isinstance(message.content, list):
-            blocks = [_serialize_content_block(b) for b in message.content]
-            content = [b for b in blocks if b]
-        elif isinstance(message.content, str):
-            content, extra = _truncate(message.content)
-            if extra:
-                content = {"text": content, **extra}
-        else:
-            content = str(message.content)
-        d = {"role": "user", "content": content}
-        if message.parent_tool_use_id:
-            d["parent_tool_use_id"] = message.parent_tool_use_id
-        return d
-    if isinstance(message, SystemMessage):
-        return {"role": "system", "subtype": message.subtype, "data": message.data}
-    if isinstance(message, ResultMessage):
-        return {
-            "role": "result",
-            "subtype": message.subtype,
-            "duration_ms": message.duration_ms,
-            "duration_api_ms": message.duration_api_ms,
-            "is_error": message.is_error,
-            "num_turns": message.num_turns,
-            "session_id": message.session_id,
-            "total_cost_usd": message.total_cost_usd,
-            "usage": message.usage,
-            "result": message.result,
-            "structured_output": getattr(message, "structured_output", None),
-        }
-    return None
+        content = [b for b in blocks if b]
+    elif isinstance(message.content, str):
+        content, extra = _truncate(message.content)
+        if extra:
+            content = {"text": content, **extra}
+    else:
+        content = str(message.content)
+    d = {"role": "user", "content": content}
+    if message.parent_tool_use_id:
+        d["parent_tool_use_id"] = message.parent_tool_use_id
+    return d
+
+
+def _serialize_system(message: SystemMessage) -> dict:
+    return {"role": "system", "subtype": message.subtype, "data": message.data}
+
+
+def _serialize_result(message: ResultMessage) -> dict:
+    return {
+        "role": "result",
+        "subtype": message.subtype,
+        "duration_ms": message.duration_ms,
+        "duration_api_ms": message.duration_api_ms,
+        "is_error": message.is_error,
+        "num_turns": message.num_turns,
+        "session_id": message.session_id,
+        "total_cost_usd": message.total_cost_usd,
+        "usage": message.usage,
+        "result": message.result,
+        "structured_output": getattr(message, "structured_output", None),
+    }
+
+
+_MESSAGE_SERIALIZERS: dict[type, Callable[[object], dict]] = {
+    AssistantMessage: _serialize_assistant,
+    UserMessage: _serialize_user,
+    SystemMessage: _serialize_system,
+    ResultMessage: _serialize_result,
+}
+
+
+def _serialize_message(message) -> dict | None:
+    handler = _dispatch(_MESSAGE_SERIALIZERS, message)
+    return handler(message) if handler is not None else None
 
 
 def _tool_detail(name: str, input_data) -> str:
@@ -145,7 +232,8 @@ class InvocationResult:
     response: str = ""
     duration_seconds: float = 0.0
     cost_usd: float = 0.0
-    tools_used: list[str] = field(default_factory=list)
+    # Tool name -> number of calls, in first-use order.
+    tools_used: Counter[str] = field(default_factory=Counter)
     turns: int = 0
     conversation: list[dict] = field(default_factory=list)
     session_id: str | None = None
@@ -176,27 +264,36 @@ async def invoke_claude(
         options.resume = resume
 
     result = InvocationResult()
-    response_parts: list[str] = []
+    response = io.StringIO()
+    text_blocks = 0
     start = time.monotonic()
+    # Only the most recent messages are kept; older ones fall off the front.
+    # AGENT_LOG_MAX_MESSAGES=0 skips serializing them at all.
+    conversation: deque[dict] = deque(maxlen=MAX_CONVERSATION_MESSAGES)
+    record_conversation = MAX_CONVERSATION_MESSAGES > 0
 
     try:
         async for message in query(prompt=prompt, options=options):
             if message is None:
                 continue
 
-            serialized = _serialize_message(message)
-            if serialized is not None:
-                result.conversation.append(serialized)
+            if record_conversation:
+                serialized = _serialize_message(message)
+                if serialized is not None:
+                    conversation.append(serialized)
 
             if isinstance(message, AssistantMessage):
                 result.turns += 1
                 for block in message.content:
                     if isinstance(block, TextBlock):
-                        response_parts.append(block.text)
+                        if text_blocks:
+                            response.write("\n")
+                        response.write(block.text)
+                        text_blocks += 1
                         if on_text:
                             on_text(block.text)
                     elif isinstance(block, ToolUseBlock):
-                        result.tools_used.append(block.name)
+                        result.tools_used[block.name] += 1
                         if on_event:
                             on_event({
                                 "type": "tool_use",
@@ -231,6 +328,8 @@ async def invoke_claude(
         result.duration_seconds = time.monotonic() - start
         raise LLMError(f"Agent failed: {e}") from e
 
+    result.conversation = list(conversation)
+
     result.duration_seconds = time.monotonic() - start
-    result.response = "\n".join(response_parts)
+    result.response = response.getvalue()
     return result
@@ -0,0 +1,27 @@
+"""Invocation log files -- helpers shared by the CLI and the web UI."""
+
+from __future__ import annotations
+
+import heapq
+import os
+from pathlib import Path
+
+# Log fields left out of the "<id>.log.hdr" sidecar, so listings never
+# parse the transcript.
+LOG_BODY_FIELDS = frozenset({"conversation"})
+
+
+def is_log_entry(entry: os.DirEntry) -> bool:
+    # d_type from the directory listing; no extra stat on most filesystems.
+    return entry.name.endswith(".log") and entry.is_file(follow_symlinks=False)
+
+
+def logs_newest_first(logs_dir: Path, limit: int | None = None) -> list[os.DirEntry]:
+    """The ``.log`` entries in *logs_dir*, newest first, at most *limit*."""
+    with os.scandir(logs_dir) as it:
+        logs = [(e.stat().st_mtime, e) for e in it if is_log_entry(e)]
+    if limit is not None and limit < len(logs):
+        logs = heapq.nlargest(limit, logs, key=lambda x: x[0])
+    else:
+        logs.sort(key=lambda x: x[0], reverse=True)
+    return [e for _, e in logs]
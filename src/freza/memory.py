@@ -3,33 +3,80 @@
 from __future__ import annotations
 
 import fcntl
-import json
 import os
+import threading
 import time
+from collections.abc import Collection
 from contextlib import contextmanager
 from pathlib import Path
 from typing import Any
 
+from freza import jsonio
 from freza.config import Config
 
 
+# Lock files stay open for the life of the process: lock path -> (fd,
+# in-process lock). flock() locks belong to the open file, which all threads
+# share, so the threading.Lock is what keeps two threads of one process out
+# of each other's critical section.
+_lock_fds: dict[str, tuple[int, threading.Lock]] = {}
+_lock_fds_guard = threading.Lock()
+
+
+def _reset_lock_fds():
+    # A forked child shares its parent's open files, and with them the
+    # flock state; it has to open its own.
+    global _lock_fds_guard
+    for fd, _ in _lock_fds.values():
+        os.close(fd)
+    _lock_fds.clear()
+    _lock_fds_guard = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_lock_fds)
+
+
 @contextmanager
 def _flock(path: Path, exclusive: bool = True):
-    lock_path = path.parent / (path.name + ".lock")
-    fd = os.open(str(lock_path), os.O_CREAT | os.O_WRONLY)
+    lock_path = os.path.join(path.parent, path.name + ".lock")
+    with _lock_fds_guard:
+        held = _lock_fds.get(lock_path)
+        if held is None:
+            fd = os.open(lock_path, os.O_CREAT | os.O_WRONLY | os.O_CLOEXEC)
+            held = _lock_fds[lock_path] = (fd, threading.Lock())
+    fd, thread_lock = held
+    with thread_lock:
+        fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+
+
+def _atomic_write(path: Path, content: str | bytes) -> os.stat_result:
+    """Replace *path* with *content*; returns the new file's stat."""
+    if isinstance(content, str):
+        content = content.encode()
+    # Per-process temp name, so unlocked writers never share one.
+    tmp = f"{path}.{os.getpid()}.tmp"
     try:
-        mode = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
-        fcntl.flock(fd, mode)
-        yield
-    finally:
-        fcntl.flock(fd, fcntl.LOCK_UN)
-        os.close(fd)
+        with open(tmp, "wb") as f:
+            f.write(content)
+            st = os.fstat(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+    return st
 
 
-def _atomic_write(path: Path, content: str):
-    tmp = path.with_suffix(path.suffix + ".tmp")
-    tmp.write_text(content)
-    tmp.rename(path)
+# memory file -> ((inode, mtime_ns, size), text), shared by all managers in
+# the process so long-lived callers (the web UI) skip unchanged re-reads.
+_read_cache: dict[Path, tuple[tuple[int, int, int], str]] = {}
 
 
 class MemoryManager:
@@ -37,56 +84,107 @@ class MemoryManager:
         self.config = config
         self.agent_name = agent_name
         self._memory_file = config.agent_memory_file(agent_name)
+        # instance_id -> ((inode, mtime_ns, size), data) of our last write.
+        self._short_term_written: dict[str, tuple[tuple[int, int, int], dict[str, Any]]] = {}
 
     def read(self) -> str:
-        if not self._memory_file.exists():
+        try:
+            st = os.stat(self._memory_file)
+        except FileNotFoundError:
             return ""
+        # write() replaces the file and append() grows it, so an unchanged
+        # (inode, mtime, size) means the text we last read is still current.
+        key = (st.st_ino, st.st_mtime_ns, st.st_size)
+        cached = _read_cache.get(self._memory_file)
+        if cached is not None and cached[0] == key:
+            return cached[1]
         with _flock(self._memory_file, exclusive=False):
-            if self._memory_file.exists():
-                return self._memory_file.read_text()
-            return ""
+            try:
+                with open(self._memory_file) as f:
+                    st = os.fstat(f.fileno())
+                    text = f.read()
+            except FileNotFoundError:
+                return ""
+        _read_cache[self._memory_file] = ((st.st_ino, st.st_mtime_ns, st.st_size), text)
+        return text
 
     def write(self, content: str):
         with _flock(self._memory_file, exclusive=True):
             _atomic_write(self._memory_file, content)
 
     def append(self, content: str):
+        data = ("\n" + content + "\n").encode()
         with _flock(self._memory_file, exclusive=True):
-            existing = ""
-            if self._memory_file.exists():
-                existing = self._memory_file.read_text()
-            _atomic_write(self._memory_file, existing + "\n" + content + "\n")
+            fd = os.open(self._memory_file, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            try:
+                while data:
+                    data = data[os.write(fd, data):]
+            finally:
+                os.close(fd)
 
     def _short_term_path(self, instance_id: str) -> Path:
         return self.config.short_term_dir / f"{instance_id}.json"
 
     def read_short_term(self, instance_id: str) -> dict[str, Any] | None:
         p = self._short_term_path(instance_id)
-        if not p.exists():
-            return None
         try:
-            return json.loads(p.read_text())
-        except (json.JSONDecodeError, OSError):
+            with open(p, "rb") as f:
+                return jsonio.loads(f.read())
+        except (jsonio.JSONDecodeError, OSError):
             return None
 
     def write_short_term(self, instance_id: str, data: dict[str, Any]):
-        _atomic_write(self._short_term_path(instance_id), json.dumps(data, indent=2))
+        # Stays indented JSON: the agent itself reads and edits this file.
+        st = _atomic_write(self._short_term_path(instance_id), jsonio.dumps(data, indent=True))
+        self._short_term_written[instance_id] = (
+            (st.st_ino, st.st_mtime_ns, st.st_size), dict(data)
+        )
 
     def update_short_term(self, instance_id: str, **fields):
-        existing = self.read_short_term(instance_id) or {}
+        existing = None
+        written = self._short_term_written.get(instance_id)
+        if written is not None:
+            # Skip the read-back if the file is still the one we wrote.
+            try:
+                st = os.stat(self._short_term_path(instance_id))
+                if written[0] == (st.st_ino, st.st_mtime_ns, st.st_size):
+                    existing = dict(written[1])
+            except FileNotFoundError:
+                pass
+        if existing is None:
+            existing = self.read_short_term(instance_id) or {}
         existing.update(fields)
         existing["updated_at"] = time.time()
         self.write_short_term(instance_id, existing)
 
     def remove_short_term(self, instance_id: str):
+        self._short_term_written.pop(instance_id, None)
         self._short_term_path(instance_id).unlink(missing_ok=True)
 
-    def get_all_short_term(self) -> dict[str, dict[str, Any]]:
+    def get_all_short_term(
+        self, instance_ids: Collection[str] | None = None
+    ) -> dict[str, dict[str, Any]]:
+        """Read every short-term file in one directory pass.
+
+        With *instance_ids*, only those instances' files are read.
+        """
         result: dict[str, dict[str, Any]] = {}
-        if not self.config.short_term_dir.exists():
+        try:
+            it = os.scandir(self.config.short_term_dir)
+        except FileNotFoundError:
             return result
-        for f in self.config.short_term_dir.glob("*.json"):
-            data = self.read_short_term(f.stem)
-            if data:
-                result[f.stem] = data
+        with it:
+            for entry in it:
+                if not entry.name.endswith(".json") or not entry.is_file(follow_symlinks=False):
+                    continue
+                instance_id = entry.name[:-5]
+                if instance_ids is not None and instance_id not in instance_ids:
+                    continue
+                try:
+                    with open(entry.path, "rb") as f:
+                        data = jsonio.loads(f.read())
+                except (jsonio.JSONDecodeError, OSError):
+                    continue
+                if data:
+                    result[instance_id] = data
         return result
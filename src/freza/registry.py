@@ -2,19 +2,20 @@
 
 from __future__ import annotations
 
-import fcntl
-import json
 import os
 import time
 import threading
-import uuid
-from dataclasses import dataclass, asdict
+from collections.abc import Iterable
+from dataclasses import dataclass, fields
+from pathlib import Path
 from typing import Any
 
+from freza import jsonio
 from freza.config import Config
+from freza.memory import _flock
 
 
-@dataclass
+@dataclass(slots=True)
 class InstanceInfo:
     instance_id: str
     pid: int
@@ -26,44 +27,181 @@ class InstanceInfo:
     status: str = "running"
     agent_name: str = "default"
 
+    # All fields are flat scalars, so a shallow copy is enough; asdict()
+    # would deep-copy every value.
     def to_dict(self) -> dict[str, Any]:
-        return asdict(self)
+        return {name: getattr(self, name) for name in _INSTANCE_FIELDS}
 
     @classmethod
     def from_dict(cls, d: dict[str, Any]) -> InstanceInfo:
-        return cls(**{k: v for k, v in d.items() if k in cls.__dataclass_fields__})
+        # Walk the dataclass fields rather than every key of the record.
+        return cls(**{k: d[k] for k in _INSTANCE_FIELDS if k in d})
 
 
-def _lock_path(config: Config) -> str:
-    return str(config.registry_file) + ".lock"
+_INSTANCE_FIELDS = tuple(f.name for f in fields(InstanceInfo))
 
 
-def _locked_update(config: Config, fn):
-    lock = _lock_path(config)
-    fd = os.open(lock, os.O_CREAT | os.O_WRONLY)
-    try:
-        fcntl.flock(fd, fcntl.LOCK_EX)
-        entries: list[dict] = []
-        if config.registry_file.exists():
-            try:
-                entries = json.loads(config.registry_file.read_text())
-            except (json.JSONDecodeError, OSError):
-                entries = []
-        entries = fn(entries)
-        tmp = config.registry_file.with_suffix(".tmp")
-        tmp.write_text(json.dumps(entries, indent=2))
-        tmp.rename(config.registry_file)
-        return entries
-    finally:
-        fcntl.flock(fd, fcntl.LOCK_UN)
-        os.close(fd)
+# registry.jsonl is an append-only log, one JSON record per line:
+#   - a full record (has "pid") adds or replaces an instance,
+#   - {"instance_id", "removed": true} drops it,
+#   - any other record updates fields of a known instance (heartbeats,
+#     status changes) and is ignored for unknown ones.
+# Readers replay only what was appended since their last read; the file is
+# rewritten with just the live records once superseded lines dominate.
+# A rewrite starts with a {"generation": <random hex>} line (ignored by
+# _apply): the new file may reuse the old one's inode, so a reader only
+# resumes at its saved offset if the file's first line is still the one
+# it saw.
+#
+# Heartbeats do not go through the log at all: each instance has an empty
+# file in heartbeat_dir whose mtime is its latest heartbeat, so a beat is
+# one utime() with no lock and no file growth.
+COMPACT_MIN_LINES = 64
+COMPACT_RATIO = 10
+
+
+def _apply(entries: dict[str, dict[str, Any]], rec: dict[str, Any]):
+    instance_id = rec.get("instance_id")
+    if rec.get("removed"):
+        entries.pop(instance_id, None)
+    elif "pid" in rec:
+        entries[instance_id] = rec
+    elif instance_id in entries:
+        entries[instance_id].update(rec)
+
+
+def _rewrite(path: Path, entries: dict[str, dict[str, Any]]):
+    """Replace the log with a fresh generation holding just *entries*."""
+    tmp = path.with_suffix(".tmp")
+    header = jsonio.dumps({"generation": os.urandom(8).hex()}) + b"\n"
+    with open(tmp, "wb") as f:
+        f.write(header + b"".join(jsonio.dumps(e) + b"\n" for e in entries.values()))
+    os.replace(tmp, path)
 
 
 class InstanceRegistry:
     def __init__(self, config: Config):
         self.config = config
-        self._heartbeat_stop: threading.Event | None = None
-        self._heartbeat_thread: threading.Thread | None = None
+        # Instances this object started heartbeating, for stop_heartbeat().
+        self._heartbeat_ids: set[str] = set()
+        # (inode, ctime_ns, bytes replayed, lines replayed,
+        # instance_id -> record, first line of the file)
+        self._cache: tuple[int, int, int, int, dict[str, dict[str, Any]], bytes] | None = None
+        # Guards the cache: heartbeat threads and web UI request threads
+        # share one registry object.
+        self._mutex = threading.RLock()
+        legacy = config.registry_file.with_suffix(".json")
+        if not config.registry_file.exists() and legacy.exists():
+            self._import_legacy(legacy)
+
+    def _import_legacy(self, legacy: Path):
+        """Seed registry.jsonl from a pre-log registry.json array, once."""
+        path = self.config.registry_file
+        with _flock(path):
+            if path.exists():
+                return
+            try:
+                records = jsonio.loads(legacy.read_bytes())
+            except FileNotFoundError:
+                return
+            except (jsonio.JSONDecodeError, OSError):
+                records = []
+            if not isinstance(records, list):
+                records = []
+            entries: dict[str, dict[str, Any]] = {}
+            for rec in records:
+                if isinstance(rec, dict):
+                    _apply(entries, rec)
+            _rewrite(path, entries)
+
+    def _load(self) -> tuple[dict[str, dict[str, Any]], int]:
+        """Return (instance_id -> record, line count), replaying new appends.
+
+        The dict is updated in place by later loads; hold ``_mutex`` while
+        using it.
+        """
+        cached = self._cache
+        if cached is not None:
+            # Unchanged since the last replay: one stat, no open or parse.
+            # An append moves the size; a rewrite that happens to reuse the
+            # inode at the same size still moves the ctime.
+            try:
+                st = os.stat(self.config.registry_file)
+            except FileNotFoundError:
+                self._cache = None
+                return {}, 0
+            if cached[:3] == (st.st_ino, st.st_ctime_ns, st.st_size):
+                return cached[4], cached[3]
+        try:
+            f = open(self.config.registry_file, "rb")
+        except FileNotFoundError:
+            self._cache = None
+            return {}, 0
+        with f:
+            st = os.fstat(f.fileno())
+            head = f.readline()
+            cached = self._cache
+            if (
+                cached is not None
+                and cached[0] == st.st_ino
+                and cached[2] <= st.st_size
+                and cached[5] == head
+            ):
+                _, _, offset, lines, entries, _ = cached
+                f.seek(offset)
+            else:
+                offset, lines, entries = 0, 0, {}
+                f.seek(0)
+            chunk = f.read()
+        # A partially appended last line is picked up by the next read.
+        keep = chunk.rfind(b"\n") + 1
+        for line in chunk[:keep].splitlines():
+            try:
+                rec = jsonio.loads(line)
+            except jsonio.JSONDecodeError:
+                continue
+            if isinstance(rec, dict):
+                _apply(entries, rec)
+            lines += 1
+        if not head.endswith(b"\n"):
+            head = b""  # Still being written; compare again next time.
+        self._cache = (st.st_ino, st.st_ctime_ns, offset + keep, lines, entries, head)
+        return entries, lines
+
+    def _append(self, *records: dict[str, Any]):
+        path = self.config.registry_file
+        with self._mutex, _flock(self.config.registry_file):
+            with open(path, "ab") as f:
+                f.write(b"".join(jsonio.dumps(r) + b"\n" for r in records))
+            entries, lines = self._load()
+            if lines > max(COMPACT_MIN_LINES, COMPACT_RATIO * len(entries)):
+                _rewrite(path, entries)
+
+    def _heartbeat_path(self, instance_id: str) -> str:
+        return os.path.join(self.config.heartbeat_dir, instance_id + ".hb")
+
+    def _heartbeats(self) -> dict[str, float]:
+        """instance_id -> mtime of its heartbeat file, in one directory pass."""
+        try:
+            it = os.scandir(self.config.heartbeat_dir)
+        except FileNotFoundError:
+            return {}
+        beats: dict[str, float] = {}
+        with it:
+            for entry in it:
+                if entry.name.endswith(".hb"):
+                    try:
+                        beats[entry.name[:-3]] = entry.stat().st_mtime
+                    except FileNotFoundError:
+                        pass
+        return beats
+
+    def _unlink_heartbeats(self, instance_ids: Iterable[str]):
+        for instance_id in instance_ids:
+            try:
+                os.unlink(self._heartbeat_path(instance_id))
+            except FileNotFoundError:
+                pass
 
     def register(
         self,
@@ -74,7 +212,7 @@ class InstanceRegistry:
     ) -> InstanceInfo:
         now = time.time()
         info = InstanceInfo(
-            instance_id=uuid.uuid4().hex[:16],
+            instance_id=os.urandom(8).hex(),
             pid=os.getpid(),
             mode=mode,
             channel_name=channel_name,
@@ -83,69 +221,132 @@ class InstanceRegistry:
             last_heartbeat=now,
             agent_name=agent_name,
         )
-
-        def _add(entries):
-            entries.append(info.to_dict())
-            return entries
-
-        _locked_update(self.config, _add)
+        path = self._heartbeat_path(info.instance_id)
+        try:
+            os.close(os.open(path, os.O_CREAT | os.O_WRONLY))
+        except FileNotFoundError:
+            os.makedirs(self.config.heartbeat_dir, exist_ok=True)
+            os.close(os.open(path, os.O_CREAT | os.O_WRONLY))
+        self._append(info.to_dict())
         return info
 
     def deregister(self, instance_id: str, status: str = "finished"):
         if status == "finished":
-            _locked_update(self.config, lambda es: [
-                e for e in es if e.get("instance_id") != instance_id
-            ])
+            self._append({"instance_id": instance_id, "removed": True})
+            self._unlink_heartbeats([instance_id])
         else:
-            def _mark_failed(entries):
-                return [
-                    {**e, "status": status}
-                    if e.get("instance_id") == instance_id
-                    else e
-                    for e in entries
-                ]
-            _locked_update(self.config, _mark_failed)
+            self._append({"instance_id": instance_id, "status": status})
 
     def heartbeat(self, instance_id: str):
-        now = time.time()
+        try:
+            os.utime(self._heartbeat_path(instance_id))
+        except FileNotFoundError:
+            # Deregistered or already dropped as stale; don't resurrect it.
+            pass
 
-        def _update(entries):
-            for e in entries:
-                if e.get("instance_id") == instance_id:
-                    e["last_heartbeat"] = now
-            return entries
-
-        _locked_update(self.config, _update)
+    def entries(self) -> list[dict[str, Any]]:
+        """All registered instances as dicts, stale ones included."""
+        beats = self._heartbeats()
+        with self._mutex:
+            entries, _ = self._load()
+            result = []
+            for instance_id, e in entries.items():
+                e = dict(e)
+                e["last_heartbeat"] = max(e.get("last_heartbeat", 0), beats.get(instance_id, 0))
+                result.append(e)
+            return result
 
     def get_active(self) -> list[InstanceInfo]:
+        beats = self._heartbeats()
         now = time.time()
         threshold = self.config.stale_threshold
+        active: list[InstanceInfo] = []
+        stale: list[str] = []
+        with self._mutex:
+            entries, _ = self._load()
+            for instance_id, e in entries.items():
+                last = max(e.get("last_heartbeat", 0), beats.pop(instance_id, 0))
+                if now - last < threshold:
+                    info = InstanceInfo.from_dict(e)
+                    info.last_heartbeat = last
+                    active.append(info)
+                else:
+                    stale.append(instance_id)
+        if stale:
+            # Stale instances are dropped for good, as before; a late
+            # heartbeat does not bring them back.
+            self._append(*({"instance_id": i, "removed": True} for i in stale))
+        # Heartbeat files left by stale instances, or with no registry
+        # record at all (e.g. a crash mid-register).
+        self._unlink_heartbeats(
+            stale + [i for i, mtime in beats.items() if now - mtime >= threshold]
+        )
+        return active
 
-        def _prune(entries):
-            return [
-                e for e in entries
-                if now - e.get("last_heartbeat", 0) < threshold
-            ]
-
-        entries = _locked_update(self.config, _prune)
-        return [InstanceInfo.from_dict(e) for e in entries]
+    def heartbeat_many(self, instance_ids: Iterable[str]):
+        for instance_id in instance_ids:
+            self.heartbeat(instance_id)
 
     def start_heartbeat(self, instance_id: str):
-        self._heartbeat_stop = threading.Event()
-        interval = self.config.heartbeat_interval
+        self._heartbeat_ids.add(instance_id)
+        HeartbeatScheduler.for_config(self.config).add(instance_id)
+
+    def stop_heartbeat(self):
+        scheduler = HeartbeatScheduler.for_config(self.config)
+        while self._heartbeat_ids:
+            scheduler.remove(self._heartbeat_ids.pop())
 
-        def _loop():
-            while not self._heartbeat_stop.wait(interval):
-                try:
-                    self.heartbeat(instance_id)
-                except Exception:
-                    pass
 
-        self._heartbeat_thread = threading.Thread(target=_loop, daemon=True)
-        self._heartbeat_thread.start()
+class HeartbeatScheduler:
+    """Heartbeats every live instance of this process from one thread,
+    instead of every instance running its own timer thread.
+    """
 
-    def stop_heartbeat(self):
-        if self._heartbeat_stop:
-            self._heartbeat_stop.set()
-        if self._heartbeat_thread:
-            self._heartbeat_thread.join(timeout=5)
+    _schedulers: dict[str, HeartbeatScheduler] = {}
+    _schedulers_lock = threading.Lock()
+
+    def __init__(self, config: Config):
+        self.registry = InstanceRegistry(config)
+        self._ids: set[str] = set()
+        self._lock = threading.Lock()
+        self._stop: threading.Event | None = None
+        self._thread: threading.Thread | None = None
+
+    @classmethod
+    def for_config(cls, config: Config) -> HeartbeatScheduler:
+        key = str(config.registry_file)
+        with cls._schedulers_lock:
+            scheduler = cls._schedulers.get(key)
+            if scheduler is None:
+                scheduler = cls._schedulers[key] = cls(config)
+            return scheduler
+
+    def add(self, instance_id: str):
+        with self._lock:
+            self._ids.add(instance_id)
+            if self._thread is None:
+                self._stop = threading.Event()
+                self._thread = threading.Thread(
+                    target=self._loop, args=(self._stop,), daemon=True
+                )
+                self._thread.start()
+
+    def remove(self, instance_id: str):
+        with self._lock:
+            self._ids.discard(instance_id)
+            if self._ids or self._thread is None:
+                return
+            stop, thread = self._stop, self._thread
+            self._stop = self._thread = None
+        stop.set()
+        thread.join(timeout=5)
+
+    def _loop(self, stop: threading.Event):
+        interval = self.registry.config.heartbeat_interval
+        while not stop.wait(interval):
+            with self._lock:
+                ids = list(self._ids)
+            try:
+                self.registry.heartbeat_many(ids)
+            except Exception:
+                pass
@@ -0,0 +1,176 @@
+"""Pre-warmed fork server for agent invocations started by the web UI.
+
+Spawning ``python -m freza channel ...`` per chat message pays interpreter
+startup and every import (the Claude Agent SDK included) each time.  The
+fork server is forked once, before the HTTP server starts any threads,
+imports the CLI up front and then forks a child per request; children run
+``freza.cli.main`` with the same argv the subprocess would have received.
+"""
+
+from __future__ import annotations
+
+import importlib
+import json
+import os
+import signal
+import socket
+import sys
+import traceback
+from collections.abc import Iterable
+from threading import Lock
+
+PRELOAD_MODULES = ("freza.cli", "freza.llm")
+
+
+class ForkServer:
+    def __init__(self):
+        self._sock: socket.socket | None = None
+        self._lock = Lock()
+
+    def start(self, preload: Iterable[str] = PRELOAD_MODULES):
+        """Fork the server process. Must be called while single-threaded."""
+        parent, child = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            parent.close()
+            try:
+                _serve(child, preload)
+            finally:
+                os._exit(0)
+        child.close()
+        self._sock = parent
+
+    def spawn(self, argv: list[str], cwd: str) -> tuple[int, int, int] | None:
+        """Run ``freza.cli.main`` with *argv* in a forked child.
+
+        Returns ``(pidfd, stdout_fd, stderr_fd)``: a pidfd for the child,
+        readable once it exits, and the read ends of its output pipes. None
+        if the fork server is not available (the caller should then start
+        a subprocess instead).
+        """
+        if self._sock is None:
+            return None
+        out_r, out_w = os.pipe()
+        err_r, err_w = os.pipe()
+        pidfds: list[int] = []
+        try:
+            request = json.dumps({"argv": argv, "cwd": cwd}).encode() + b"\n"
+            with self._lock:
+                socket.send_fds(self._sock, [request], [out_w, err_w])
+                reply = b""
+                while not reply.endswith(b"\n"):
+                    chunk, fds, _, _ = socket.recv_fds(self._sock, 64, 1)
+                    pidfds += fds
+                    if not chunk:
+                        raise ConnectionError("fork server exited")
+                    reply += chunk
+            int(reply)  # The child's pid; "-" if it could not be started.
+            if len(pidfds) != 1:
+                raise ValueError("no pidfd for the child")
+        except (OSError, ValueError):
+            for fd in (out_r, err_r, *pidfds):
+                os.close(fd)
+            self.close()
+            return None
+        finally:
+            os.close(out_w)
+            os.close(err_w)
+        return pidfds[0], out_r, err_r
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+
+def _reap_children(_signum, _frame):
+    # Exit statuses are not needed: the web UI waits on each child's pidfd.
+    try:
+        while os.waitpid(-1, os.WNOHANG)[0]:
+            pass
+    except ChildProcessError:
+        pass
+
+
+def _serve(sock: socket.socket, preload: Iterable[str]):
+    # Children are reaped from the handler, and SIGCHLD is blocked from
+    # fork() until the child's pidfd is open: until then an exited child
+    # stays a zombie, so its pid cannot be reaped or reused under us.
+    signal.signal(signal.SIGCHLD, _reap_children)
+    for name in preload:
+        try:
+            importlib.import_module(name)
+        except Exception:
+            pass
+
+    buf = b""
+    fds: list[int] = []
+    while True:
+        data, new_fds, _, _ = socket.recv_fds(sock, 65536, 2)
+        if not data:
+            return
+        buf += data
+        fds += new_fds
+        while b"\n" in buf and len(fds) >= 2:
+            line, buf = buf.split(b"\n", 1)
+            out_w, err_w = fds[:2]
+            del fds[:2]
+            request = json.loads(line)
+            sys.stdout.flush()
+            sys.stderr.flush()
+            signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGCHLD})
+            try:
+                pid = os.fork()
+                if pid == 0:
+                    sock.close()
+                    _run_child(request, out_w, err_w)
+                try:
+                    pidfd = os.pidfd_open(pid)
+                except OSError:
+                    os.kill(pid, signal.SIGKILL)
+                    pidfd = None
+            finally:
+                signal.pthread_sigmask(signal.SIG_UNBLOCK, {signal.SIGCHLD})
+            os.close(out_w)
+            os.close(err_w)
+            if pidfd is None:
+                sock.sendall(b"-\n")
+            else:
+                socket.send_fds(sock, [f"{pid}\n".encode()], [pidfd])
+                os.close(pidfd)
+
+
+def _run_child(request: dict, out_w: int, err_w: int):
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+    signal.pthread_sigmask(signal.SIG_UNBLOCK, {signal.SIGCHLD})
+    os.dup2(out_w, 1)
+    os.dup2(err_w, 2)
+    os.close(out_w)
+    os.close(err_w)
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.close(devnull)
+
+    code = 0
+    try:
+        os.chdir(request["cwd"])
+        sys.argv = request["argv"]
+        from freza.cli import main
+        main()
+    except SystemExit as e:
+        if isinstance(e.code, int):
+            code = e.code
+        elif e.code is not None:
+            print(e.code, file=sys.stderr)
+            code = 1
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(code)
@@ -2,24 +2,33 @@
 
 from __future__ import annotations
 
+import gzip
 import hmac
-import json
 import mimetypes
 import os
-import re
+import select
 import signal
+import stat
 import subprocess
 import sys
 import time
 import uuid
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from http.server import HTTPServer, BaseHTTPRequestHandler
 from socketserver import ThreadingMixIn
 from pathlib import Path
-from threading import Lock, Thread
-from urllib.parse import urlparse, parse_qs, unquote
+from threading import BoundedSemaphore, Condition, Lock, Thread
+from urllib.parse import parse_qs, unquote
 
-from freza.agents import DEFAULT_AGENT_NAME, is_valid_agent_name
+from freza import jsonio
+from freza.agents import DEFAULT_AGENT_NAME, AgentManager, is_valid_agent_name
+from freza.channels import ChannelManager
 from freza.config import Config
+from freza.logs import LOG_BODY_FIELDS, is_log_entry
+from freza.memory import MemoryManager
+from freza.registry import InstanceRegistry
+from freza.webui.prefork import ForkServer
 
 STATIC_DIR = Path(__file__).resolve().parent
 DIST_DIR = STATIC_DIR / "dist"
@@ -66,7 +75,8 @@ _FRONTEND_BUILD_MISSING_HTML = """<!doctype html>
 
 _config: Config | None = None
 _auth_required: bool = False
-_auth_token: str | None = None
+# Encoded once in run() so compare_digest never re-encodes it.
+_auth_token: bytes | None = None
 
 
 def _cfg() -> Config:
@@ -74,22 +84,182 @@ def _cfg() -> Config:
     return _config
 
 
+_registry: InstanceRegistry | None = None
+
+
+def _shared_registry() -> InstanceRegistry:
+    # One long-lived reader, so polling only replays new registry appends.
+    global _registry
+    if _registry is None or _registry.config is not _cfg():
+        _registry = InstanceRegistry(_cfg())
+    return _registry
+
+
+_agents: AgentManager | None = None
+_channels: ChannelManager | None = None
+
+
+def _shared_agents() -> AgentManager:
+    # Long-lived, so its stat-keyed cache and name index survive requests.
+    global _agents
+    if _agents is None or _agents.config is not _cfg():
+        _agents = AgentManager(_cfg())
+        _agents.list_agents()
+    return _agents
+
+
+def _shared_channels() -> ChannelManager:
+    global _channels
+    if _channels is None or _channels.config is not _cfg():
+        _channels = ChannelManager(_cfg())
+    return _channels
+
+
 def _read_json(path: Path):
     try:
-        return json.loads(path.read_text())
+        with open(path, "rb") as f:
+            return jsonio.loads(f.read())
     except Exception:
         return None
 
 
+# Log path -> ((mtime_ns, size), parsed log without its conversation).
+# Logs are written once, so after warm-up listings parse only new files.
+_LOG_CACHE_MAX = 5000
+_log_cache: OrderedDict[str, tuple[tuple[int, int], dict | None]] = OrderedDict()
+_log_cache_lock = Lock()
+# Cold listings read their logs on a small pool; below this many uncached
+# logs the pool costs more than it saves.
+_PARALLEL_LOAD_MIN = 16
+_log_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="freza-logs")
+
+
+def _log_key(entry: os.DirEntry) -> tuple[int, int] | None:
+    try:
+        st = entry.stat()
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _warm_log_cache(entries: list[os.DirEntry]):
+    """Parse the uncached logs among *entries* in parallel."""
+    keys = [(e, _log_key(e)) for e in entries]
+    misses = []
+    with _log_cache_lock:
+        for e, key in keys:
+            cached = _log_cache.get(e.path)
+            if key is not None and (cached is None or cached[0] != key):
+                misses.append(e)
+    if len(misses) >= _PARALLEL_LOAD_MIN:
+        list(_log_pool.map(_load_log, misses))
+
+
+def _load_log(entry: os.DirEntry) -> dict | None:
+    """A log's fields minus the (large) conversation, parsed at most once per
+    version of the file. Callers must not modify the returned dict."""
+    key = _log_key(entry)
+    if key is None:
+        return None
+    with _log_cache_lock:
+        cached = _log_cache.get(entry.path)
+        if cached is not None and cached[0] == key:
+            _log_cache.move_to_end(entry.path)
+            return cached[1]
+    # The sidecar has every field but the conversation; sidecars from
+    # before that (status fields only) lack instance_id.
+    data = _read_json(entry.path + ".hdr")
+    if not isinstance(data, dict) or "instance_id" not in data:
+        data = _read_json(entry.path)
+        if isinstance(data, dict):
+            for k in LOG_BODY_FIELDS:
+                data.pop(k, None)
+        else:
+            data = None
+    with _log_cache_lock:
+        _log_cache[entry.path] = (key, data)
+        _log_cache.move_to_end(entry.path)
+        while len(_log_cache) > _LOG_CACHE_MAX:
+            _log_cache.popitem(last=False)
+    return data
+
+
+# The logs directory's (path, mtime_ns, inode) -> its .log entries newest first,
+# and their ETag. Logs are only ever written by rename into place, which
+# bumps the directory's mtime, so an unchanged directory needs no rescan.
+_log_listing: tuple[tuple[str, int, int], list[os.DirEntry], str] | None = None
+# A directory changed this recently may change again within the same
+# timestamp tick, so its mtime alone can't prove the listing is current.
+_LOG_LISTING_RACY_NS = 2_000_000_000
+
+
+def _load_log_listing() -> tuple[list[os.DirEntry], str]:
+    global _log_listing
+    logs_dir = _cfg().logs_dir
+    try:
+        st = os.stat(logs_dir)
+    except FileNotFoundError:
+        return [], 'W/"0-0-0"'
+    dir_key = (str(logs_dir), st.st_mtime_ns, st.st_ino)
+    cached = _log_listing
+    if (
+        cached is not None
+        and cached[0] == dir_key
+        and time.time_ns() - st.st_mtime_ns > _LOG_LISTING_RACY_NS
+    ):
+        return cached[1], cached[2]
+    keyed = []
+    try:
+        with os.scandir(logs_dir) as it:
+            for e in it:
+                if is_log_entry(e):
+                    key = _log_key(e)
+                    if key is not None:
+                        keyed.append((key, e))
+    except FileNotFoundError:
+        return [], 'W/"0-0-0"'
+    keyed.sort(key=lambda x: x[0][0], reverse=True)
+    entries = [e for _, e in keyed]
+    newest = keyed[0][0][0] if keyed else 0
+    total = sum(key[1] for key, _ in keyed)
+    # Weak validator for everything derived from the logs directory.
+    etag = f'W/"{len(keyed)}-{newest}-{total}"'
+    _log_listing = (dir_key, entries, etag)
+    return entries, etag
+
+
+def _log_dir_entries() -> list[os.DirEntry]:
+    """The logs directory's .log entries, newest first. Do not modify."""
+    return _load_log_listing()[0]
+
+
+def _logs_etag() -> str:
+    return _load_log_listing()[1]
+
+
+def _file_etag(path: Path) -> str:
+    """Weak validator for a file that is only ever replaced whole."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return 'W/"0"'
+    return f'W/"{st.st_mtime_ns:x}-{st.st_size:x}-{st.st_ino:x}"'
+
+
+def _newest_logs(limit: int | None = None) -> list[os.DirEntry]:
+    entries = _log_dir_entries()
+    return entries if limit is None else entries[:limit]
+
+
 def _list_logs(limit=50, offset=0):
-    cfg = _cfg()
-    files = sorted(cfg.logs_dir.glob("*.log"), key=lambda f: f.stat().st_mtime, reverse=True)
     results = []
-    for f in files[offset:offset + limit]:
+    page = _newest_logs(offset + limit)[offset:]
+    _warm_log_cache(page)
+    for e in page:
         try:
-            data = json.loads(f.read_text())
+            data = _load_log(e)
             results.append({
-                "id": data.get("instance_id", f.stem),
+                "id": data.get("instance_id", e.name[:-4]),
                 "mode": data.get("mode"),
                 "agent": data.get("agent_name"),
                 "channel": data.get("channel_name"),
@@ -100,34 +270,22 @@ def _list_logs(limit=50, offset=0):
                 "tools": data.get("tools_used", []),
                 "turns": data.get("turns"),
                 "timestamp": data.get("timestamp"),
-                "file": f.name,
+                "file": e.name,
             })
         except Exception:
             continue
     return results
 
 
-def _get_log_detail(filename: str):
-    path = _cfg().logs_dir / filename
-    if not path.exists() or not path.is_file():
-        return None
-    try:
-        return json.loads(path.read_text())
-    except Exception:
-        return None
-
-
 def _list_threads():
-    cfg = _cfg()
-    if not cfg.logs_dir.exists():
-        return []
     threads = {}
-    for f in cfg.logs_dir.glob("*.log"):
-        try:
-            data = json.loads(f.read_text())
-        except Exception:
+    entries = _log_dir_entries()
+    _warm_log_cache(entries)
+    for e in entries:
+        data = _load_log(e)
+        if data is None:
             continue
-        tid = data.get("thread_id") or data.get("instance_id", f.stem)
+        tid = _log_thread_id(e, data)
         trigger = (data.get("trigger_message") or "")[:200]
         ts = data.get("timestamp", 0)
         if tid not in threads:
@@ -146,16 +304,64 @@ def _list_threads():
     return sorted(threads.values(), key=lambda t: t["last_timestamp"], reverse=True)
 
 
+def _log_thread_id(entry: os.DirEntry, data: dict) -> str:
+    return data.get("thread_id") or data.get("instance_id", entry.name[:-4])
+
+
+# Thread ID -> paths of its logs, plus path -> ((mtime_ns, size), thread ID)
+# recording which version of each log was indexed.
+_thread_logs: dict[str, set[str]] = {}
+_log_thread: dict[str, tuple[tuple[int, int], str | None]] = {}
+_thread_index_lock = Lock()
+
+
+def _unindex_log(path: str, tid: str | None):
+    paths = _thread_logs.get(tid)
+    if paths is not None:
+        paths.discard(path)
+        if not paths:
+            del _thread_logs[tid]
+
+
+def _refresh_thread_index() -> dict[str, os.DirEntry]:
+    """Bring the thread index up to date with the logs directory; only
+    new or changed logs are looked at. Returns path -> DirEntry."""
+    listing = _log_dir_entries()
+    _warm_log_cache(listing)
+    entries = {e.path: e for e in listing}
+    with _thread_index_lock:
+        for path in _log_thread.keys() - entries.keys():
+            _unindex_log(path, _log_thread.pop(path)[1])
+        for path, e in entries.items():
+            try:
+                st = e.stat()
+            except OSError:
+                continue
+            key = (st.st_mtime_ns, st.st_size)
+            known = _log_thread.get(path)
+            if known is not None:
+                if known[0] == key:
+                    continue
+                _unindex_log(path, known[1])
+            data = _load_log(e)
+            tid = _log_thread_id(e, data) if data is not None else None
+            _log_thread[path] = (key, tid)
+            if tid is not None:
+                _thread_logs.setdefault(tid, set()).add(path)
+    return entries
+
+
 def _get_thread(thread_id: str):
-    cfg = _cfg()
+    logs = _refresh_thread_index()
+    with _thread_index_lock:
+        paths = list(_thread_logs.get(thread_id, ()))
     entries = []
-    for f in cfg.logs_dir.glob("*.log"):
-        try:
-            data = json.loads(f.read_text())
-        except Exception:
+    for path in paths:
+        e = logs.get(path)
+        data = _load_log(e) if e is not None else None
+        if data is None:
             continue
-        tid = data.get("thread_id") or data.get("instance_id", f.stem)
-        if tid == thread_id:
+        if _log_thread_id(e, data) == thread_id:
             entries.append({
                 "trigger_message": data.get("trigger_message", ""),
                 "response": data.get("response", ""),
@@ -172,44 +378,76 @@ def _get_thread(thread_id: str):
 
 
 def _get_instances():
-    data = _read_json(_cfg().registry_file)
-    if isinstance(data, list):
-        return data
-    return []
+    return _shared_registry().entries()
 
 
-def _get_short_term():
-    results = []
-    for f in _cfg().short_term_dir.glob("*.json"):
-        try:
-            results.append(json.loads(f.read_text()))
-        except Exception:
-            continue
-    return results
+# Short-term file path -> ((mtime_ns, size, inode), parsed contents). Files
+# are replaced atomically, so an unchanged key means an unchanged file.
+_short_term_cache: dict[str, tuple[tuple[int, int, int], dict | None]] = {}
+
+
+def _get_short_term(limit: int | None = None, offset: int = 0):
+    """Short-term memory records, most recently written first; only new or
+    changed files are parsed."""
+    global _short_term_cache
+    cache = _short_term_cache
+    fresh: dict[str, tuple[tuple[int, int, int], dict | None]] = {}
+    found = []
+    try:
+        with os.scandir(_cfg().short_term_dir) as it:
+            for e in it:
+                if not e.name.endswith(".json") or not e.is_file(follow_symlinks=False):
+                    continue
+                try:
+                    st = e.stat()
+                except OSError:
+                    continue
+                key = (st.st_mtime_ns, st.st_size, st.st_ino)
+                cached = cache.get(e.path)
+                if cached is not None and cached[0] == key:
+                    data = cached[1]
+                else:
+                    data = _read_json(e.path)
+                fresh[e.path] = (key, data)
+                if data:
+                    found.append((key[0], data))
+    except FileNotFoundError:
+        pass
+    _short_term_cache = fresh
+    found.sort(key=lambda x: x[0], reverse=True)
+    end = None if limit is None else offset + limit
+    return [data for _, data in found[offset:end]]
 
 
 def _get_memory(agent_name: str = "default"):
     try:
-        mem_file = _cfg().agent_memory_file(agent_name)
-        if mem_file.exists():
-            return mem_file.read_text()
-        return ""
+        return MemoryManager(_cfg(), agent_name=agent_name).read()
     except Exception:
         return ""
 
 
 def _get_channels():
-    data = _read_json(_cfg().channels_meta)
+    data = _shared_channels().list_channels()
     if isinstance(data, list):
         return data
     return []
 
 
 def _get_agents():
-    data = _read_json(_cfg().agents_meta)
-    if isinstance(data, list):
-        return data
-    return []
+    return _shared_agents().list_agents()
+
+
+def _int_params(query: str, **defaults: int | None) -> tuple[int | None, ...]:
+    """Integer query parameters named by *defaults*, in that order; first
+    occurrence wins and blank values keep the default, as with parse_qs.
+    Raises ValueError for a non-integer value."""
+    found: dict[str, int] = {}
+    if query:
+        for part in query.split("&"):
+            key, _, value = part.partition("=")
+            if value and key in defaults and key not in found:
+                found[key] = int(value)
+    return tuple(found.get(k, d) for k, d in defaults.items())
 
 
 def _parse_agent_name(raw: str | None) -> str:
@@ -224,24 +462,24 @@ def _parse_agent_name(raw: str | None) -> str:
 
 
 def _is_registered_agent(name: str) -> bool:
-    return any(a.get("name") == name for a in _get_agents())
+    return _shared_agents().has_agent(name)
 
 
 def _get_system_stats():
-    cfg = _cfg()
-    files = list(cfg.logs_dir.glob("*.log"))
+    files = _log_dir_entries()
     total_runs = len(files)
     total_cost = 0.0
     total_duration = 0.0
-    channel_counts: dict[str, int] = {}
+    channel_counts: Counter[str] = Counter()
 
-    for f in sorted(files, key=lambda f: f.stat().st_mtime, reverse=True)[:200]:
+    recent = files[:200]
+    _warm_log_cache(recent)
+    for e in recent:
         try:
-            data = json.loads(f.read_text())
+            data = _load_log(e)
             total_cost += data.get("cost_usd") or 0.0
             total_duration += data.get("duration_seconds") or 0.0
-            ch = data.get("channel_name") or "unknown"
-            channel_counts[ch] = channel_counts.get(ch, 0) + 1
+            channel_counts[data.get("channel_name") or "unknown"] += 1
         except Exception:
             continue
 
@@ -249,12 +487,93 @@ def _get_system_stats():
         "total_runs": total_runs,
         "total_cost_usd": round(total_cost, 4),
         "total_duration_s": round(total_duration, 1),
-        "channel_counts": channel_counts,
+        "channel_counts": dict(channel_counts),
     }
 
 
-_LOG_LINE_RE = re.compile(r"^\[[\da-f]+\] ")
-_EVENT_PREFIX = "\x1e"
+# Built frontend assets: path -> ((mtime_ns, size), content type, body,
+# gzipped body or None). They only change on a rebuild. Large assets that
+# don't compress keep no body and go out with sendfile instead.
+_STATIC_CACHE_MAX_BYTES = 64 * 1024 * 1024
+_SENDFILE_MIN_BYTES = 256 * 1024
+_static_cache: OrderedDict[str, tuple[tuple[int, int], str, bytes | None, bytes | None]] = OrderedDict()
+_static_cache_bytes = 0
+_static_cache_lock = Lock()
+_GZIP_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+# Below this, gzip framing eats most of the saving.
+_GZIP_MIN_BYTES = 1024
+
+
+def _static_file(path: Path) -> tuple[tuple[int, int], str, bytes | None, bytes | None] | None:
+    global _static_cache_bytes
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    if not stat.S_ISREG(st.st_mode):
+        return None
+    key = (st.st_mtime_ns, st.st_size)
+    name = str(path)
+    with _static_cache_lock:
+        cached = _static_cache.get(name)
+        if cached is not None and cached[0] == key:
+            _static_cache.move_to_end(name)
+            return cached
+    content_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+    compressible = content_type.startswith(_GZIP_TYPES)
+    body = gzipped = None
+    if compressible or st.st_size < _SENDFILE_MIN_BYTES:
+        try:
+            body = path.read_bytes()
+        except OSError:
+            return None
+        if compressible and len(body) > _GZIP_MIN_BYTES:
+            gzipped = gzip.compress(body, 6)
+    entry = (key, content_type, body, gzipped)
+    size = _static_entry_bytes(entry)
+    with _static_cache_lock:
+        old = _static_cache.pop(name, None)
+        if old is not None:
+            _static_cache_bytes -= _static_entry_bytes(old)
+        if size <= _STATIC_CACHE_MAX_BYTES:
+            _static_cache[name] = entry
+            _static_cache_bytes += size
+            while _static_cache_bytes > _STATIC_CACHE_MAX_BYTES:
+                _, evicted = _static_cache.popitem(last=False)
+                _static_cache_bytes -= _static_entry_bytes(evicted)
+    return entry
+
+
+def _static_entry_bytes(entry) -> int:
+    return len(entry[2] or b"") + len(entry[3] or b"")
+
+
+_HEX_DIGITS = b"0123456789abcdef"
+
+
+def _is_log_line(line: bytes) -> bool:
+    """True for "[<hex>] " prefixed log noise on agent stdout."""
+    if line[:1] != b"[":
+        return False
+    end = line.find(b"] ", 1)
+    return end > 1 and not line[1:end].strip(_HEX_DIGITS)
+
+_SSE_KEEPALIVE_SEC = 15
+# POST bodies are small chat messages; refuse anything bigger unread.
+_MAX_BODY_BYTES = 1 << 20
+_EVENT_PREFIX = b"\x1e"
+_READ_CHUNK = 65536
+
+
+_AGENT_ENV: dict[str, str] | None = None
+
+
+def _agent_env() -> dict[str, str]:
+    """Environment for Popen-spawned agents, built once; Popen only reads it."""
+    global _AGENT_ENV
+    if _AGENT_ENV is None:
+        _AGENT_ENV = {k: v for k, v in os.environ.items() if k != "CLAUDECODE"}
+    return _AGENT_ENV
 
 
 class AgentProcess:
@@ -264,78 +583,193 @@ class AgentProcess:
         self.thread_id = thread_id
         self.agent_name = agent_name
         self.process: subprocess.Popen | None = None
-        self.output_chunks: list[dict] = []
+        # Ready-to-send SSE frames, encoded once as output arrives and
+        # appended back to back; readers keep a byte offset into it.
+        self.frames = bytearray()
         self.done = False
+        # Signalled on every new frame and on completion.
+        self._changed = Condition()
+        # Monotonic time of the last start, finish or stream read; done
+        # processes idle past _PROC_TTL_SEC are reaped.
+        self.last_active = time.monotonic()
 
     def start(self):
         cfg = _cfg()
-        env = os.environ.copy()
-        env.pop("CLAUDECODE", None)
-
-        cmd = cfg.agent_cmd_argv + ["channel", "webui", self.message, "--agent", self.agent_name]
+        args = ["channel", "webui", self.message, "--agent", self.agent_name]
         if self.thread_id:
-            cmd += ["--thread-id", self.thread_id]
-        self.process = subprocess.Popen(
-            cmd,
-            cwd=str(cfg.base_dir),
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            bufsize=1,
-            env=env,
-        )
+            args += ["--thread-id", self.thread_id]
+        cmd = cfg.agent_cmd_argv + args
+
+        spawned = None
+        if _fork_server is not None:
+            # Same argv main() would see as "python -m freza ...".
+            spawned = _fork_server.spawn(["freza"] + cmd[3:], str(cfg.base_dir))
+        if spawned is not None:
+            # The child's grandchildren can hold its pipes open after it
+            # exits, so wait on the process itself (its pidfd, opened by
+            # the fork server right after fork()), as Popen.wait() does.
+            pidfd, out_fd, err_fd = spawned
+        else:
+            self.process = subprocess.Popen(
+                cmd,
+                cwd=str(cfg.base_dir),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                bufsize=0,
+                env=_agent_env(),
+            )
+            out_fd = self.process.stdout.fileno()
+            err_fd = self.process.stderr.fileno()
+
+        def _frame(line: bytes) -> bytes | None:
+            if _is_log_line(line):
+                return None
+            payload = None
+            if line[:1] == _EVENT_PREFIX:
+                try:
+                    payload = jsonio.loads(line[1:])
+                    payload.pop("kind", None)
+                except (jsonio.JSONDecodeError, UnicodeDecodeError, AttributeError, TypeError):
+                    payload = None
+            if payload is None:
+                payload = {"text": line.decode("utf-8", "replace")}
+            return b"data: " + jsonio.dumps(payload) + b"\n\n"
 
         def _stdout_reader():
+            # Raw reads in large chunks; a burst of lines becomes one
+            # syscall and one wakeup for the stream handlers.
+            buf = bytearray()
             try:
                 while True:
-                    line = self.process.stdout.readline()
-                    if not line:
+                    chunk = os.read(out_fd, _READ_CHUNK)
+                    if not chunk:
                         break
-                    if _LOG_LINE_RE.match(line):
+                    buf += chunk
+                    end = buf.rfind(b"\n") + 1
+                    if not end:
                         continue
-                    if line.startswith(_EVENT_PREFIX):
-                        try:
-                            event = json.loads(line[1:])
-                            event["kind"] = "event"
-                            self.output_chunks.append(event)
-                        except json.JSONDecodeError:
-                            self.output_chunks.append({"kind": "text", "text": line})
-                    else:
-                        self.output_chunks.append({"kind": "text", "text": line})
+                    frames = [
+                        frame
+                        for line in bytes(buf[:end]).splitlines(keepends=True)
+                        if (frame := _frame(line)) is not None
+                    ]
+                    del buf[:end]
+                    if frames:
+                        with self._changed:
+                            self.frames += b"".join(frames)
+                            self._changed.notify_all()
+                if buf:
+                    frame = _frame(bytes(buf))
+                    if frame is not None:
+                        with self._changed:
+                            self.frames += frame
+                            self._changed.notify_all()
             except Exception:
                 pass
+            finally:
+                if spawned is not None:
+                    os.close(out_fd)
 
         def _stderr_reader():
             try:
-                while True:
-                    line = self.process.stderr.readline()
-                    if not line:
-                        break
+                while os.read(err_fd, _READ_CHUNK):
+                    pass
             except Exception:
                 pass
+            finally:
+                if spawned is not None:
+                    os.close(err_fd)
 
         def _waiter():
             t_out = Thread(target=_stdout_reader, daemon=True)
             t_err = Thread(target=_stderr_reader, daemon=True)
             t_out.start()
             t_err.start()
-            self.process.wait()
+            if self.process is not None:
+                self.process.wait()
+            else:
+                # Readable once the forked child has exited.
+                select.select([pidfd], [], [])
+                os.close(pidfd)
+            # Readers own the forked child's pipe fds and close them at EOF,
+            # however long a lingering grandchild keeps them open.
             t_out.join(timeout=2)
             t_err.join(timeout=2)
-            self.done = True
+            with self._changed:
+                self.done = True
+                self.last_active = time.monotonic()
+                self._changed.notify_all()
 
         Thread(target=_waiter, daemon=True).start()
 
-    def get_new_chunks(self, from_idx=0):
-        return self.output_chunks[from_idx:], len(self.output_chunks)
+    def get_new_frames(self, from_idx=0) -> tuple[bytearray, int]:
+        """Frame bytes past offset *from_idx* (a copy), and the offset to
+        resume at."""
+        with self._changed:
+            return self.frames[from_idx:], len(self.frames)
+
+    def wait_for_new(self, from_idx: int, timeout: float) -> bool:
+        """Block until there are frame bytes past *from_idx* or the process is
+        done; returns False on timeout."""
+        with self._changed:
+            return self._changed.wait_for(
+                lambda: len(self.frames) > from_idx or self.done, timeout
+            )
 
 
+_fork_server: ForkServer | None = None
+
+
+def _can_wait_on_pids() -> bool:
+    """Forked agents are not our children, so telling when one exits needs
+    pidfd_open (Linux 5.3+); without it, agents run via Popen."""
+    if not hasattr(os, "fork") or not hasattr(os, "pidfd_open"):
+        return False
+    try:
+        os.close(os.pidfd_open(os.getpid()))
+    except OSError:
+        return False
+    return True
+
+# proc_id -> process, oldest first. Entries normally leave when a stream
+# drains them; _reap_procs drops the ones no client came back for.
 _active_procs: dict[str, AgentProcess] = {}
 _proc_lock = Lock()
 _proc_counter = 0
+_PROC_TTL_SEC = 300
+_PROC_MAX = 128
+_PROC_REAP_INTERVAL_SEC = 60
+
+
+def _reap_procs(now: float | None = None):
+    """Drop finished processes idle past the TTL, then the oldest finished
+    ones while over _PROC_MAX. Running processes are never dropped."""
+    now = time.monotonic() if now is None else now
+    with _proc_lock:
+        done = [pid for pid, p in _active_procs.items() if p.done]
+        excess = len(_active_procs) - _PROC_MAX
+        for pid in done:
+            if excess > 0 or now - _active_procs[pid].last_active > _PROC_TTL_SEC:
+                del _active_procs[pid]
+                excess -= 1
+
+
+def _reap_loop():
+    while True:
+        time.sleep(_PROC_REAP_INTERVAL_SEC)
+        _reap_procs()
 
 
 class WebUIHandler(BaseHTTPRequestHandler):
+    # Keep-alive, so polling clients reuse connections; every response
+    # carries a Content-Length or closes the connection.
+    protocol_version = "HTTP/1.1"
+    # Socket timeout: drops idle keep-alive connections and clients that
+    # trickle a request in or stop reading a response.
+    timeout = 30
+    # SSE frames are small writes right after the headers; don't let Nagle
+    # hold them back waiting for the client's delayed ACK.
+    disable_nagle_algorithm = True
 
     def log_message(self, format, *args):
         pass
@@ -348,10 +782,10 @@ class WebUIHandler(BaseHTTPRequestHandler):
         if auth_header.startswith("Bearer "):
             token = auth_header[7:]
         if not token:
-            parsed = urlparse(self.path)
-            params = parse_qs(parsed.query)
-            token = params.get("token", [None])[0]
-        if token and hmac.compare_digest(token, _auth_token):
+            query = self.path.partition("?")[2]
+            if query:
+                token = parse_qs(query).get("token", [None])[0]
+        if token and hmac.compare_digest(token.encode("utf-8"), _auth_token):
             return True
         self._json_response({"error": "unauthorized"}, 401)
         return False
@@ -361,18 +795,62 @@ class WebUIHandler(BaseHTTPRequestHandler):
         self.send_header("Access-Control-Allow-Methods", "GET, POST, OPTIONS")
         self.send_header("Access-Control-Allow-Headers", "Content-Type, Authorization")
 
-    def _json_response(self, data, status=200):
-        body = json.dumps(data, default=str).encode()
-        self._bytes_response(body, "application/json", status=status)
+    def _json_response(self, data, status=200, etag: str | None = None):
+        body = jsonio.dumps(data, default=str)
+        gzipped = None
+        if len(body) > _GZIP_MIN_BYTES and self._accepts_gzip():
+            # Level 1: built per response, so speed matters more than ratio.
+            gzipped = gzip.compress(body, 1)
+        self._bytes_response(body, "application/json", status=status, gzipped=gzipped, etag=etag)
+
+    def _accepts_gzip(self) -> bool:
+        return "gzip" in self.headers.get("Accept-Encoding", "")
+
+    def _not_modified(self, etag: str) -> bool:
+        """Send 304 and return True if the client already holds *etag*."""
+        if_none_match = self.headers.get("If-None-Match")
+        if not if_none_match or not (
+            if_none_match.strip() == "*" or etag in (t.strip() for t in if_none_match.split(","))
+        ):
+            return False
+        self.send_response(304)
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "no-cache")
+        self._cors_headers()
+        self.end_headers()
+        return True
+
+    def _etag_json_response(self, etag: str, build):
+        """JSON from *build()*, or 304 when the client's copy has *etag*;
+        *build* only runs when the body is actually sent."""
+        if not self._not_modified(etag):
+            self._json_response(build(), etag=etag)
 
     def _html_response(self, html: str):
         self._bytes_response(html.encode("utf-8"), "text/html; charset=utf-8")
 
-    def _bytes_response(self, body: bytes, content_type: str, status=200):
+    def _bytes_response(
+        self,
+        body: bytes,
+        content_type: str,
+        status=200,
+        gzipped: bytes | None = None,
+        etag: str | None = None,
+    ):
         self.send_response(status)
         self.send_header("Content-Type", content_type)
         self._cors_headers()
+        if etag is not None:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+        if gzipped is not None:
+            self.send_header("Vary", "Accept-Encoding")
+            if self._accepts_gzip():
+                body = gzipped
+                self.send_header("Content-Encoding", "gzip")
         self.send_header("Content-Length", str(len(body)))
+        if self.close_connection:
+            self.send_header("Connection", "close")
         self.end_headers()
         self.wfile.write(body)
 
@@ -384,21 +862,76 @@ class WebUIHandler(BaseHTTPRequestHandler):
         except Exception:
             return False
 
-        if not target.exists() or not target.is_file():
+        cached = _static_file(target)
+        if cached is None:
             return False
+        _, content_type, body, gzipped = cached
+        if body is None:
+            return self._sendfile_response(target, content_type)
+        self._bytes_response(body, content_type, gzipped=gzipped)
+        return True
 
-        content_type = mimetypes.guess_type(target.name)[0] or "application/octet-stream"
-        self._bytes_response(target.read_bytes(), content_type)
+    def _sendfile_response(self, path: Path, content_type: str) -> bool:
+        try:
+            f = open(path, "rb")
+        except OSError:
+            return False
+        with f:
+            self._send_open_file(f, os.fstat(f.fileno()).st_size, content_type)
         return True
 
-    def _serve_frontend(self, path: str):
-        index_path = DIST_DIR / "index.html"
-        if not index_path.exists():
-            self._html_response(_FRONTEND_BUILD_MISSING_HTML)
-            return
+    def _send_open_file(self, f, size: int, content_type: str, etag: str | None = None):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self._cors_headers()
+        if etag is not None:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+        self.send_header("Content-Length", str(size))
+        self.end_headers()
+        # os.sendfile where the platform has it, plain sends otherwise.
+        self.connection.sendfile(f, 0, size)
+
+    def _send_log_file(self, filename: str) -> bool:
+        """Stream a ``.log`` file as stored, without parsing or re-encoding it.
+
+        Only ``.log`` files are served, and they are not validated as JSON:
+        the CLI writes them whole with an atomic replace, so a regular file
+        that starts with ``{`` and ends with ``}`` is taken to be a complete
+        log. Memory use doesn't grow with its size.
+        """
+        logs_dir = _cfg().logs_dir
+        if Path(filename).name != filename or not filename.endswith(".log"):
+            return False
+        try:
+            f = open(logs_dir / filename, "rb")
+        except OSError:
+            return False
+        with f:
+            st = os.fstat(f.fileno())
+            if (
+                not stat.S_ISREG(st.st_mode)
+                or f.read(1) != b"{"
+                or os.pread(f.fileno(), 1, st.st_size - 1) != b"}"
+            ):
+                return False
+            etag = f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+            if not self._not_modified(etag):
+                self._send_open_file(f, st.st_size, "application/json", etag=etag)
+        return True
+
+    def _serve_index(self) -> bool:
+        cached = _static_file(DIST_DIR / "index.html")
+        if cached is None:
+            return False
+        _, _, body, gzipped = cached
+        self._bytes_response(body, "text/html; charset=utf-8", gzipped=gzipped)
+        return True
 
+    def _serve_frontend(self, path: str):
         if path == "/" or path == "":
-            self._html_response(index_path.read_text(encoding="utf-8"))
+            if not self._serve_index():
+                self._html_response(_FRONTEND_BUILD_MISSING_HTML)
             return
 
         rel_path = unquote(path.lstrip("/"))
@@ -407,7 +940,12 @@ class WebUIHandler(BaseHTTPRequestHandler):
 
         # SPA fallback for client-side routes like /logs or /settings.
         if "." not in Path(rel_path).name:
-            self._html_response(index_path.read_text(encoding="utf-8"))
+            if not self._serve_index():
+                self._html_response(_FRONTEND_BUILD_MISSING_HTML)
+            return
+
+        if not (DIST_DIR / "index.html").exists():
+            self._html_response(_FRONTEND_BUILD_MISSING_HTML)
             return
 
         self._json_response({"error": "not found"}, 404)
@@ -416,7 +954,8 @@ class WebUIHandler(BaseHTTPRequestHandler):
         self.send_response(200)
         self.send_header("Content-Type", "text/event-stream")
         self.send_header("Cache-Control", "no-cache")
-        self.send_header("Connection", "keep-alive")
+        # No Content-Length: the stream ends when the connection closes.
+        self.send_header("Connection", "close")
         self._cors_headers()
         self.end_headers()
 
@@ -426,9 +965,8 @@ class WebUIHandler(BaseHTTPRequestHandler):
         self.end_headers()
 
     def do_GET(self):
-        parsed = urlparse(self.path)
-        path = parsed.path.rstrip("/") or "/"
-        params = parse_qs(parsed.query)
+        path, _, query = self.path.partition("?")
+        path = path.rstrip("/") or "/"
 
         if not path.startswith("/api/"):
             self._serve_frontend(path)
@@ -437,152 +975,258 @@ class WebUIHandler(BaseHTTPRequestHandler):
         if not self._check_auth():
             return
 
-        if path == "/api/ping":
-            self._json_response({"status": "ok"})
-        elif path == "/api/stats":
-            self._json_response(_get_system_stats())
-        elif path == "/api/logs":
-            limit = int(params.get("limit", [50])[0])
-            offset = int(params.get("offset", [0])[0])
-            self._json_response(_list_logs(limit, offset))
-        elif path.startswith("/api/logs/"):
-            filename = path.split("/api/logs/")[1]
-            detail = _get_log_detail(filename)
-            if detail:
-                self._json_response(detail)
-            else:
-                self._json_response({"error": "not found"}, 404)
-        elif path == "/api/threads":
-            self._json_response(_list_threads())
-        elif path.startswith("/api/threads/"):
-            tid = path.split("/api/threads/")[1]
-            entries = _get_thread(tid)
-            self._json_response(entries)
-        elif path == "/api/instances":
-            self._json_response(_get_instances())
-        elif path == "/api/short-term":
-            self._json_response(_get_short_term())
-        elif path == "/api/memory":
-            try:
-                agent_name = _parse_agent_name(params.get("agent", [DEFAULT_AGENT_NAME])[0])
-            except ValueError as e:
-                self._json_response({"error": str(e)}, 400)
-                return
-            if not _is_registered_agent(agent_name):
-                self._json_response({"error": f"unknown agent '{agent_name}'"}, 404)
-                return
-            self._json_response({"content": _get_memory(agent_name), "agent": agent_name})
-        elif path == "/api/channels":
-            self._json_response(_get_channels())
-        elif path == "/api/agents":
-            self._json_response(_get_agents())
-
-        elif path.startswith("/api/stream/"):
-            proc_id = path.split("/api/stream/")[1]
-            proc = _active_procs.get(proc_id)
-            if not proc:
-                self._json_response({"error": "process not found"}, 404)
+        self._dispatch(self._GET_ROUTES, self._GET_PREFIX_ROUTES, path, query)
+
+    def do_POST(self):
+        path, _, query = self.path.partition("?")
+        path = path.rstrip("/")
+
+        if path not in self._POST_ROUTES:
+            # Only routed handlers read the body; close rather than parse
+            # the unread bytes as the next request on this connection.
+            self.close_connection = True
+        if not self._check_auth():
+            self.close_connection = True
+            return
+
+        self._dispatch(self._POST_ROUTES, (), path, query)
+
+    def _dispatch(self, routes, prefix_routes, path: str, query: str):
+        # Handlers get the raw query string and parse it only if they use it.
+        handler = routes.get(path)
+        if handler is not None:
+            handler(self, "", query)
+            return
+        for prefix, handler in prefix_routes:
+            if path.startswith(prefix):
+                handler(self, path[len(prefix):], query)
                 return
+        self._json_response({"error": "not found"}, 404)
 
-            self._sse_headers()
-            idx = 0
-            try:
-                while True:
-                    chunks, new_idx = proc.get_new_chunks(idx)
-                    if chunks:
-                        for chunk in chunks:
-                            if chunk["kind"] == "text":
-                                payload = {"text": chunk["text"]}
-                            else:
-                                payload = {k: v for k, v in chunk.items() if k != "kind"}
-                            self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode())
-                        self.wfile.flush()
-                        idx = new_idx
-                    elif proc.done:
-                        self.wfile.write(f"data: {json.dumps({'done': True})}\n\n".encode())
-                        self.wfile.flush()
-                        _active_procs.pop(proc_id, None)
-                        break
-                    else:
-                        time.sleep(0.15)
-            except (BrokenPipeError, ConnectionResetError):
-                pass
+    def _handle_ping(self, _rest, _query):
+        self._json_response({"status": "ok"})
 
-        else:
+    def _handle_stats(self, _rest, _query):
+        self._etag_json_response(_logs_etag(), _get_system_stats)
+
+    def _handle_logs(self, _rest, query):
+        try:
+            limit, offset = _int_params(query, limit=50, offset=0)
+        except ValueError:
+            self._json_response({"error": "limit and offset must be integers"}, 400)
+            return
+        self._etag_json_response(_logs_etag(), lambda: _list_logs(limit, offset))
+
+    def _handle_log_detail(self, filename, _query):
+        if not self._send_log_file(filename):
             self._json_response({"error": "not found"}, 404)
 
-    def do_POST(self):
-        parsed = urlparse(self.path)
-        path = parsed.path.rstrip("/")
+    def _handle_threads(self, _rest, _query):
+        self._etag_json_response(_logs_etag(), _list_threads)
 
-        if not self._check_auth():
+    def _handle_thread(self, tid, _query):
+        self._json_response(_get_thread(tid))
+
+    def _handle_instances(self, _rest, _query):
+        self._json_response(_get_instances())
+
+    def _handle_short_term(self, _rest, query):
+        try:
+            limit, offset = _int_params(query, limit=None, offset=0)
+        except ValueError:
+            self._json_response({"error": "limit and offset must be integers"}, 400)
+            return
+        self._json_response(_get_short_term(limit, offset))
+
+    def _handle_memory(self, _rest, query):
+        params = parse_qs(query)
+        try:
+            agent_name = _parse_agent_name(params.get("agent", [DEFAULT_AGENT_NAME])[0])
+        except ValueError as e:
+            self._json_response({"error": str(e)}, 400)
             return
+        if not _is_registered_agent(agent_name):
+            self._json_response({"error": f"unknown agent '{agent_name}'"}, 404)
+            return
+        self._json_response({"content": _get_memory(agent_name), "agent": agent_name})
+
+    def _handle_channels(self, _rest, _query):
+        self._etag_json_response(_file_etag(_cfg().channels_meta), _get_channels)
+
+    def _handle_agents(self, _rest, _query):
+        self._etag_json_response(_file_etag(_cfg().agents_meta), _get_agents)
 
-        if path == "/api/chat":
+    def _handle_stream(self, proc_id, _query):
+        proc = _active_procs.get(proc_id)
+        if not proc:
+            self._json_response({"error": "process not found"}, 404)
+            return
+
+        self._sse_headers()
+        idx = 0
+        try:
+            while True:
+                proc.last_active = time.monotonic()
+                # Read done first: it is set only after the last frame, so a
+                # true value here means the fetch below sees everything.
+                done = proc.done
+                frames, new_idx = proc.get_new_frames(idx)
+                if frames:
+                    self.wfile.write(frames)
+                    self.wfile.flush()
+                    idx = new_idx
+                if done:
+                    self.wfile.write(b'data: {"done": true}\n\n')
+                    self.wfile.flush()
+                    _active_procs.pop(proc_id, None)
+                    break
+                elif not proc.wait_for_new(idx, _SSE_KEEPALIVE_SEC):
+                    # Comment frame so idle connections aren't dropped.
+                    self.wfile.write(b": ping\n\n")
+                    self.wfile.flush()
+        except OSError:
+            # Client went away, or stopped reading for longer than timeout.
+            pass
+
+    def _handle_chat(self, _rest, _query):
+        try:
             content_length = int(self.headers.get("Content-Length", 0))
-            body = self.rfile.read(content_length)
-            try:
-                data = json.loads(body)
-            except Exception:
-                self._json_response({"error": "invalid json"}, 400)
-                return
+        except ValueError:
+            content_length = -1
+        if not 0 <= content_length <= _MAX_BODY_BYTES:
+            self.close_connection = True
+            if content_length < 0:
+                self._json_response({"error": "invalid Content-Length"}, 400)
+            else:
+                self._json_response({"error": "body too large"}, 413)
+            return
+        body = self.rfile.read(content_length)
+        try:
+            data = jsonio.loads(body)
+        except Exception:
+            self._json_response({"error": "invalid json"}, 400)
+            return
 
-            message = data.get("message", "").strip()
-            if not message:
-                self._json_response({"error": "empty message"}, 400)
-                return
+        message = data.get("message", "").strip()
+        if not message:
+            self._json_response({"error": "empty message"}, 400)
+            return
 
-            thread_id = data.get("thread_id") or uuid.uuid4().hex
-            try:
-                agent_name = _parse_agent_name(data.get("agent", DEFAULT_AGENT_NAME))
-            except ValueError as e:
-                self._json_response({"error": str(e)}, 400)
-                return
-            if not _is_registered_agent(agent_name):
-                self._json_response({"error": f"unknown agent '{agent_name}'"}, 404)
-                return
+        thread_id = data.get("thread_id") or uuid.uuid4().hex
+        try:
+            agent_name = _parse_agent_name(data.get("agent", DEFAULT_AGENT_NAME))
+        except ValueError as e:
+            self._json_response({"error": str(e)}, 400)
+            return
+        if not _is_registered_agent(agent_name):
+            self._json_response({"error": f"unknown agent '{agent_name}'"}, 404)
+            return
 
-            global _proc_counter
-            with _proc_lock:
-                _proc_counter += 1
-                proc_id = f"proc_{_proc_counter}_{int(time.time())}"
+        global _proc_counter
+        with _proc_lock:
+            _proc_counter += 1
+            proc_id = f"proc_{_proc_counter}_{int(time.time())}"
 
-            proc = AgentProcess(message, thread_id=thread_id, agent_name=agent_name)
-            try:
-                proc.start()
-            except FileNotFoundError as e:
-                self._json_response(
-                    {"error": f"Failed to start agent: {e}. Is freza installed and on PATH?"},
-                    500,
-                )
-                return
+        proc = AgentProcess(message, thread_id=thread_id, agent_name=agent_name)
+        try:
+            proc.start()
+        except FileNotFoundError as e:
+            self._json_response(
+                {"error": f"Failed to start agent: {e}. Is freza installed and on PATH?"},
+                500,
+            )
+            return
+        with _proc_lock:
             _active_procs[proc_id] = proc
 
-            self._json_response({"proc_id": proc_id, "thread_id": thread_id, "agent": agent_name, "status": "started"})
+        self._json_response({"proc_id": proc_id, "thread_id": thread_id, "agent": agent_name, "status": "started"})
+
+    # Exact paths resolve with one dict lookup; prefix routes are tried in order.
+    _GET_ROUTES = {
+        "/api/ping": _handle_ping,
+        "/api/stats": _handle_stats,
+        "/api/logs": _handle_logs,
+        "/api/threads": _handle_threads,
+        "/api/instances": _handle_instances,
+        "/api/short-term": _handle_short_term,
+        "/api/memory": _handle_memory,
+        "/api/channels": _handle_channels,
+        "/api/agents": _handle_agents,
+    }
+    _GET_PREFIX_ROUTES = (
+        ("/api/logs/", _handle_log_detail),
+        ("/api/threads/", _handle_thread),
+        ("/api/stream/", _handle_stream),
+    )
+    _POST_ROUTES = {
+        "/api/chat": _handle_chat,
+    }
 
-        else:
-            self._json_response({"error": "not found"}, 404)
+
+_BUSY_BODY = b'{"error": "server busy"}'
+_BUSY_RESPONSE = (
+    b"HTTP/1.1 503 Service Unavailable\r\n"
+    b"Content-Type: application/json\r\n"
+    b"Content-Length: " + str(len(_BUSY_BODY)).encode() + b"\r\n"
+    b"Retry-After: 1\r\n"
+    b"Connection: close\r\n\r\n" + _BUSY_BODY
+)
 
 
 class ReusableHTTPServer(ThreadingMixIn, HTTPServer):
     allow_reuse_address = True
     daemon_threads = True
+    # One thread per connection, so an SSE stream never queues other
+    # requests behind it, but at most this many at once.
+    max_connections = 256
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._slots = BoundedSemaphore(self.max_connections)
+
+    def process_request(self, request, client_address):
+        if not self._slots.acquire(blocking=False):
+            try:
+                request.sendall(_BUSY_RESPONSE)
+            except OSError:
+                pass
+            self.shutdown_request(request)
+            return
+        try:
+            super().process_request(request, client_address)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def process_request_thread(self, request, client_address):
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            self._slots.release()
 
 
 def run(config: Config, host: str = "127.0.0.1", port: int = 7888, token: str | None = None):
     global _config, _auth_required, _auth_token
     _config = config
-    _auth_token = token
+    _auth_token = token.encode("utf-8") if token else None
     _auth_required = bool(token) and host != "127.0.0.1"
 
+    global _fork_server
+    if config.webui_prefork and _can_wait_on_pids():
+        # Fork before the server starts any threads.
+        _fork_server = ForkServer()
+        _fork_server.start()
+
     server = ReusableHTTPServer((host, port), WebUIHandler)
+    Thread(target=_reap_loop, daemon=True, name="freza-proc-reaper").start()
     ts = time.strftime("%Y-%m-%d %H:%M:%S")
     print(f"[{ts}] [PID {os.getpid()}] Freza Web UI running at http://{host}:{port}")
     print(f"  Base dir: {config.base_dir}")
 
     def _shutdown(sig, frame):
+        # Runs on the thread inside serve_forever(), so server.shutdown()
+        # would wait on itself; unwinding out of the loop stops it instead.
         print("\nShutting down...")
-        server.shutdown()
         sys.exit(0)
 
     signal.signal(signal.SIGINT, _shutdown)